@@ -8,7 +8,12 @@ import os
 # pythonディレクトリのパスを追加
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'python'))
 
-from tenpai_checker import check_tenpai
+from mahjong_engine import get_engine
+from rule_config import RuleConfig
+from wire_format import request_accept, serverless_response
+
+# ウォームなインスタンスでは判定エンジンを呼び出し間で使い回す
+engine = get_engine()
 
 def handler(request):
     """
@@ -45,14 +50,20 @@ def handler(request):
                 }, ensure_ascii=False)
             }
         
+        try:
+            rule = RuleConfig.from_dict(body.get('rules'))
+        except ValueError as e:
+            return {
+                'statusCode': 400,
+                'headers': {'Content-Type': 'application/json'},
+                'body': json.dumps({'error': str(e)}, ensure_ascii=False)
+            }
+        
         # 聴牌判定を実行
-        result = check_tenpai(tiles, dora)
+        result = engine.check_tenpai(tiles, dora, rule)
         
-        return {
-            'statusCode': 200,
-            'headers': {'Content-Type': 'application/json'},
-            'body': json.dumps(result, ensure_ascii=False)
-        }
+        # Accept ヘッダーでコンパクト形式が求められればその形式（base64）で返す
+        return serverless_response(result, request_accept(request))
         
     except Exception as e:
         import traceback
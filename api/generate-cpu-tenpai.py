@@ -8,7 +8,9 @@ import os
 # pythonディレクトリのパスを追加
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'python'))
 
+from cpu_strategy import DEFAULT_DIFFICULTY
 from cpu_tenpai_generator import generate_cpu_tenpai
+from wire_format import request_accept, serverless_response
 
 def handler(request):
     """
@@ -36,6 +38,13 @@ def handler(request):
         tiles = body.get('tiles') if isinstance(body, dict) else None
         dora = body.get('dora') if isinstance(body, dict) else None
         force_chiitoitsu = body.get('forceChiitoitsu', False) if isinstance(body, dict) else False
+        rank = (body.get('rank') or 'width') if isinstance(body, dict) else 'width'
+        budget_ms = body.get('timeBudgetMs') if isinstance(body, dict) else None
+        # 順位付けを指定しない場合は難易度（既定は normal）に従う
+        difficulty = body.get('difficulty') if isinstance(body, dict) else None
+        if not difficulty and not (isinstance(body, dict) and body.get('rank')):
+            difficulty = DEFAULT_DIFFICULTY
+        seed = body.get('seed') if isinstance(body, dict) else None
         
         if not tiles or not dora:
             return {
@@ -46,14 +55,18 @@ def handler(request):
                 }, ensure_ascii=False)
             }
         
-        # CPU聴牌形を生成
-        result = generate_cpu_tenpai(tiles, dora, force_chiitoitsu)
+        # CPU聴牌形を生成（配牌・ドラ・難易度・シードが不正なら400）
+        try:
+            result = generate_cpu_tenpai(tiles, dora, force_chiitoitsu, rank, budget_ms, difficulty, seed)
+        except ValueError as e:
+            return {
+                'statusCode': 400,
+                'headers': {'Content-Type': 'application/json'},
+                'body': json.dumps({'error': str(e)}, ensure_ascii=False)
+            }
         
-        return {
-            'statusCode': 200,
-            'headers': {'Content-Type': 'application/json'},
-            'body': json.dumps(result, ensure_ascii=False)
-        }
+        # Accept ヘッダーでコンパクト形式が求められればその形式（base64）で返す
+        return serverless_response(result, request_accept(request))
         
     except Exception as e:
         import traceback
@@ -4,21 +4,86 @@
 FastAPIサーバー - Render用のPython API
 """
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, Response
 from pydantic import BaseModel
 from typing import Optional, List
+from contextvars import ContextVar
+import asyncio
 import sys
 import os
+import time
 
 # pythonディレクトリのパスを追加
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'python'))
 
-from tenpai_checker import check_tenpai
-from mahjong_checker import check_win
-from cpu_tenpai_generator import generate_cpu_tenpai
+import mahjong_engine
+import wire_format
+from mahjong_engine import get_engine
+from metrics import Registry, add_stage, run_instrumented
+from rule_config import RuleConfig
+from tile_codec import parse_added_tile, parse_hand, tile_to_index
+from cpu_strategy import DEFAULT_DIFFICULTY, evaluate_candidates
+from cpu_tenpai_generator import finish_cpu_tenpai, generate_cpu_tenpai, make_rng, plan_cpu_tenpai
+from hand_search import RANK_EV
+from game_session import MemorySessionStore, SessionNotFoundError, create_session, score_waits
+from wait_table import wait_table, wait_table_binary
+from shanten import analyze_tiles as analyze_shanten
+from suit_table import get_table
+from worker_pool import PoolBrokenError, PoolOverloadedError, PoolTimeoutError, WorkerPool
 
-app = FastAPI(title="Mahjong API", version="1.0.0")
+# リクエストごとの段階別の時間（ミドルウェアで用意し、判定・JSON変換の時間を書き込む）
+_request_stages = ContextVar("request_stages", default=None)
+# Accept ヘッダーでコンパクト形式（wire_format）が求められたか
+_compact_response = ContextVar("compact_response", default=False)
+
+class TimedJSONResponse(JSONResponse):
+    """
+    JSON変換の時間を段階 "encoding" として記録するレスポンス（orjsonがあればそれで変換する）
+
+    Accept ヘッダーでコンパクト形式が求められた場合は、JSONの代わりにその形式で返す。
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.headers.add_vary_header("Accept")
+
+    def render(self, content):
+        started = time.perf_counter()
+        if _compact_response.get():
+            self.media_type = wire_format.MEDIA_TYPE
+            body = wire_format.encode(content)
+        else:
+            body = wire_format.json_bytes(content)
+        stages = _request_stages.get()
+        if stages is not None:
+            add_stage(stages, "encoding", time.perf_counter() - started)
+        return body
+
+app = FastAPI(title="Mahjong API", version="1.0.0", default_response_class=TimedJSONResponse)
+
+# エンドポイント・段階ごとの処理時間
+registry = Registry()
+
+# 判定エンジンはプロセス内で共有する（キャッシュ参照はこのプロセスで行う）
+engine = get_engine()
+
+# 判定処理はプロセスプールで実行する（環境変数で設定可能）
+pool = WorkerPool(
+    workers=int(os.environ.get("MAHJONG_WORKERS", 0)) or None,
+    max_pending=int(os.environ.get("MAHJONG_MAX_PENDING", 0)) or None,
+    timeout=float(os.environ.get("MAHJONG_REQUEST_TIMEOUT", 10)),
+    drain_timeout=float(os.environ.get("MAHJONG_DRAIN_TIMEOUT", 30)),
+)
+
+# 局ごとのセッション（件数の上限と最終アクセスからの有効期限秒数は環境変数で設定可能）
+session_store = MemorySessionStore(
+    max_sessions=int(os.environ.get("MAHJONG_MAX_SESSIONS", 10000)),
+    idle_ttl=float(os.environ.get("MAHJONG_SESSION_TTL", 1800)),
+)
+
+# バッチ判定1リクエストあたりの最大件数
+MAX_BATCH_SIZE = int(os.environ.get("MAHJONG_MAX_BATCH", 256))
 
 # CORS設定（Next.jsからのアクセスを許可）
 app.add_middleware(
@@ -29,20 +94,160 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# リクエスト全体と段階別の処理時間を記録する
+@app.middleware("http")
+async def record_metrics(request: Request, call_next):
+    stages = {}
+    token = _request_stages.set(stages)
+    compact_token = _compact_response.set(wire_format.accepts_compact(request.headers.get("accept")))
+    started = time.perf_counter()
+    try:
+        response = await call_next(request)
+    finally:
+        _request_stages.reset(token)
+        _compact_response.reset(compact_token)
+    elapsed = time.perf_counter() - started
+
+    route = request.scope.get("route")
+    endpoint = route.path if route is not None else "unmatched"
+    registry.observe("mahjong_request_seconds", elapsed, "エンドポイントごとのリクエスト処理時間",
+                     endpoint=endpoint)
+    registry.increment("mahjong_requests_total", 1, "エンドポイント・ステータスごとのリクエスト数",
+                       endpoint=endpoint, status=response.status_code)
+    # 判定（プール）とJSON変換以外の時間（入力検証・ルーティングなど）
+    measured = sum(stages[name][0] for name in ("pool", "encoding") if name in stages)
+    add_stage(stages, "framework", max(0.0, elapsed - measured))
+    registry.observe_stages(stages, endpoint=endpoint)
+    return response
+
 # リクエストモデル
+# rules: ルール設定（tsumo・riichi・ippatsu・seatWind・roundWind・akaDora、省略時はロン和了・常時リーチ）
 class TenpaiCheckRequest(BaseModel):
     tiles: List[str]
     dora: str
+    rules: Optional[dict] = None
 
 class WinCheckRequest(BaseModel):
     tiles: List[str]
     lastTile: str
     dora: str
+    rules: Optional[dict] = None
+
+class AnalyzeHandRequest(BaseModel):
+    tiles: List[str]
+    dora: str
+    visibleTiles: List[str] = []  # 捨て牌など、手牌とドラ表示牌以外で見えている牌
+    rules: Optional[dict] = None
+
+class ShantenRequest(BaseModel):
+    tiles: List[str]
+    visibleTiles: List[str] = []  # 受け入れ枚数から除く、手牌以外で見えている牌
+
+# バッチ判定の各項目は項目ごとにエラーを返すため、欠けていても受け付ける
+class TenpaiCheckItem(BaseModel):
+    tiles: List[str] = []
+    dora: Optional[str] = None
+
+class WinCheckItem(BaseModel):
+    tiles: List[str] = []
+    lastTile: Optional[str] = None
+    dora: Optional[str] = None
+
+class TenpaiCheckBatchRequest(BaseModel):
+    hands: List[TenpaiCheckItem]
+
+class WinCheckBatchRequest(BaseModel):
+    hands: List[WinCheckItem]
 
 class GenerateCpuTenpaiRequest(BaseModel):
     tiles: List[str]
     dora: str
     forceChiitoitsu: Optional[bool] = False
+    rank: Optional[str] = None           # 'width'（待ちの残り枚数）・'value'・'ev'（期待値）
+    timeBudgetMs: Optional[float] = None  # 探索の時間予算（省略時は既定値）
+    difficulty: Optional[str] = None     # 'easy'・'normal'・'hard'（rank も省略した場合は normal）
+    seed: Optional[int] = None           # 同点の候補からの選択の乱数シード（指定すると結果が再現する）
+
+class CreateSessionRequest(BaseModel):
+    dora: str
+    rules: Optional[dict] = None
+
+class RegisterHandRequest(BaseModel):
+    seat: str = "player"  # 'player' または 'cpu'
+    tiles: List[str]
+
+class DiscardRequest(BaseModel):
+    seat: str  # 捨てた側の席
+    tile: str
+
+# 起動時に分解テーブルをmmapで読み込み、プロセスプールを立ち上げる
+@app.on_event("startup")
+async def startup():
+    get_table()
+    pool.start()
+
+# 停止時は実行中の判定が終わるのを待ってからプールを閉じる
+@app.on_event("shutdown")
+async def shutdown():
+    await pool.drain()
+
+def parse_request_hand(tiles, last_tile=None, dora=None, visible_tiles=None):
+    """
+    手牌13枚を1回の走査で検証して枚数ベクトルに変換する（和了牌・ドラ表示牌・見えている牌も検証し、不正なら400）
+
+    変換した手牌はキャッシュキー・プロセスプールへの引数にそのまま使い、枚数ベクトルを作り直さない。
+    """
+    try:
+        hand = parse_hand(tiles, 13)
+        if last_tile is not None:
+            parse_added_tile(hand, last_tile)
+        if dora:
+            tile_to_index(dora)
+        if visible_tiles:
+            seen = list(hand.counts)
+            for tile in [dora] + list(visible_tiles):
+                if tile:
+                    index = tile_to_index(tile)
+                    seen[index] += 1
+                    if seen[index] > 4:
+                        raise ValueError(f"同じ牌は4枚までです: {tile}")
+        return hand
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def parse_rules(rules):
+    """
+    リクエストのルール設定を RuleConfig に変換（不正なら400）
+    """
+    try:
+        return RuleConfig.from_dict(rules)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+async def run_in_pool(func, *args, cache_key=None):
+    """
+    判定処理をプロセスプールで実行する（キャッシュにあればプールを使わない）
+    """
+    if cache_key is not None:
+        found, value = engine.cache.get(cache_key)
+        if found:
+            return value
+    started = time.perf_counter()
+    try:
+        result, timings = await pool.run(run_instrumented, func, *args)
+    except (PoolOverloadedError, PoolBrokenError) as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except PoolTimeoutError as e:
+        raise HTTPException(status_code=504, detail=str(e))
+    stages = _request_stages.get()
+    if stages is not None:
+        # ワーカーでの段階別の時間（変換・形判定・点数計算など）と、待ち時間・転送を含むプール全体の時間
+        add_stage(stages, "pool", time.perf_counter() - started)
+        for name, (seconds, calls) in timings.items():
+            add_stage(stages, name, seconds, calls)
+    if cache_key is not None:
+        engine.cache.put(cache_key, result)
+    return result
 
 # ヘルスチェック
 @app.get("/")
@@ -53,18 +258,44 @@ async def root():
 async def health():
     return {"status": "healthy"}
 
+# 処理時間のヒストグラムとキャッシュ・プールの統計（Prometheusのテキスト形式、format=json で従来のJSON）
+@app.get("/metrics")
+async def metrics(format: Optional[str] = None):
+    cache_stats = engine.cache.stats()
+    pool_stats = pool.stats()
+    if format == "json":
+        return {"resultCache": cache_stats, "workerPool": pool_stats, "sessions": session_store.stats()}
+    extra = {
+        "mahjong_cache_entries": ("gauge", "判定結果キャッシュの件数", cache_stats["size"]),
+        "mahjong_cache_hits_total": ("counter", "判定結果キャッシュのヒット数", cache_stats["hits"]),
+        "mahjong_cache_misses_total": ("counter", "判定結果キャッシュのミス数", cache_stats["misses"]),
+        "mahjong_cache_evictions_total": ("counter", "判定結果キャッシュの追い出し数", cache_stats["evictions"]),
+        "mahjong_pool_workers": ("gauge", "ワーカープロセス数", pool_stats["workers"]),
+        "mahjong_pool_in_flight": ("gauge", "実行中・待機中の判定数", pool_stats["inFlight"]),
+        "mahjong_pool_completed_total": ("counter", "完了した判定数", pool_stats["completed"]),
+        "mahjong_pool_rejected_total": ("counter", "受付を断った判定数", pool_stats["rejected"]),
+        "mahjong_pool_timeouts_total": ("counter", "タイムアウトした判定数", pool_stats["timeouts"]),
+        "mahjong_pool_restarts_total": ("counter", "異常終了で作り直したプールの数", pool_stats["restarts"]),
+        "mahjong_sessions": ("gauge", "保持しているセッション数", session_store.stats()["size"]),
+    }
+    return PlainTextResponse(registry.render(extra), media_type="text/plain; version=0.0.4")
+
 # 聴牌判定エンドポイント
 @app.post("/api/check-tenpai")
 async def check_tenpai_endpoint(request: TenpaiCheckRequest):
     try:
-        if not request.tiles or len(request.tiles) != 13:
-            raise HTTPException(status_code=400, detail="手牌は13枚である必要があります")
-        
         if not request.dora:
             raise HTTPException(status_code=400, detail="ドラ表示牌が指定されていません")
         
-        result = check_tenpai(request.tiles, request.dora)
+        hand = parse_request_hand(request.tiles, dora=request.dora)
+        rule = parse_rules(request.rules)
+        result = await run_in_pool(
+            mahjong_engine.check_tenpai, hand, request.dora, rule,
+            cache_key=engine.tenpai_cache_key(hand, request.dora, rule)
+        )
         return result
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"聴牌判定エラー: {str(e)}")
 
@@ -72,21 +303,135 @@ async def check_tenpai_endpoint(request: TenpaiCheckRequest):
 @app.post("/api/check-win")
 async def check_win_endpoint(request: WinCheckRequest):
     try:
-        if not request.tiles or len(request.tiles) != 13:
-            raise HTTPException(status_code=400, detail="手牌は13枚である必要があります")
-        
         if not request.lastTile:
             raise HTTPException(status_code=400, detail="和了牌が指定されていません")
         
         if not request.dora:
             raise HTTPException(status_code=400, detail="ドラ表示牌が指定されていません")
         
-        result = check_win(request.tiles, request.lastTile, request.dora)
+        hand = parse_request_hand(request.tiles, request.lastTile, request.dora)
+        rule = parse_rules(request.rules)
+        result = await run_in_pool(
+            mahjong_engine.check_win, hand, request.lastTile, request.dora, rule,
+            cache_key=engine.win_cache_key(hand, request.lastTile, request.dora, rule)
+        )
+        return result
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"和了判定エラー: {str(e)}")
+
+# 待ち牌解析エンドポイント（待ちごとの飜・符・点数・役・残り枚数を1回で返す）
+@app.post("/api/analyze-hand")
+async def analyze_hand_endpoint(request: AnalyzeHandRequest):
+    try:
+        if not request.dora:
+            raise HTTPException(status_code=400, detail="ドラ表示牌が指定されていません")
+        
+        hand = parse_request_hand(request.tiles, dora=request.dora, visible_tiles=request.visibleTiles)
+        rule = parse_rules(request.rules)
+        result = await run_in_pool(
+            mahjong_engine.analyze_hand, hand, request.dora, request.visibleTiles, rule
+        )
         return result
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"手牌解析エラー: {str(e)}")
+
+# 和了牌判定表エンドポイント（34種それぞれの和了可否・飜・符・点数・役、format=binary でバイナリ形式）
+@app.post("/api/wait-table")
+async def wait_table_endpoint(request: TenpaiCheckRequest, format: Optional[str] = None):
+    try:
+        if not request.dora:
+            raise HTTPException(status_code=400, detail="ドラ表示牌が指定されていません")
+
+        hand = parse_request_hand(request.tiles, dora=request.dora)
+        rule = parse_rules(request.rules)
+        if format == "binary":
+            body = await run_in_pool(wait_table_binary, hand, request.dora, rule)
+            return Response(content=body, media_type="application/octet-stream")
+        return await run_in_pool(wait_table, hand, request.dora, rule)
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"判定表作成エラー: {str(e)}")
+
+# 向聴数エンドポイント（13枚は受け入れ、14枚は打牌候補ごとの受け入れも返す）
+@app.post("/api/shanten")
+async def shanten_endpoint(request: ShantenRequest):
+    try:
+        if not request.tiles or len(request.tiles) not in (13, 14):
+            raise HTTPException(status_code=400, detail="手牌は13枚または14枚である必要があります")
+        
+        result = await run_in_pool(analyze_shanten, request.tiles, request.visibleTiles)
+        return result
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"向聴数計算エラー: {str(e)}")
+
+def check_batch_size(hands):
+    if not hands:
+        raise HTTPException(status_code=400, detail="判定する手牌が指定されていません")
+    if len(hands) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=400, detail=f"一度に判定できるのは{MAX_BATCH_SIZE}件までです")
+
+# 聴牌判定バッチエンドポイント（結果は入力順、項目ごとのエラーは各結果のerrorに入る）
+@app.post("/api/check-tenpai/batch")
+async def check_tenpai_batch_endpoint(request: TenpaiCheckBatchRequest):
+    try:
+        check_batch_size(request.hands)
+        items = [hand.model_dump() for hand in request.hands]
+        results = await run_in_pool(mahjong_engine.check_tenpai_batch, items)
+        return {"results": results}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"聴牌判定エラー: {str(e)}")
+
+# 和了判定バッチエンドポイント（同じ手牌の項目はまとめて判定する）
+@app.post("/api/check-win/batch")
+async def check_win_batch_endpoint(request: WinCheckBatchRequest):
+    try:
+        check_batch_size(request.hands)
+        items = [hand.model_dump() for hand in request.hands]
+        results = await run_in_pool(mahjong_engine.check_win_batch, items)
+        return {"results": results}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"和了判定エラー: {str(e)}")
 
-# CPU聴牌形生成エンドポイント
+async def generate_cpu_tenpai_parallel(*args, seed=None):
+    """
+    CPU聴牌形の生成（探索した候補の期待値評価をワーカーに分けて並列に行う）
+
+    候補は良い順に並んでいるので、各ワーカーに1つおきに割り振って上位から評価させ、
+    時間予算で打ち切られても上位の候補は評価済みになるようにする。
+    """
+    plan = await run_in_pool(plan_cpu_tenpai, *args)
+    candidates = plan["candidates"]
+    # 候補の選択はこのプロセスで行うので、シードは評価を並列にしても同じ結果になる
+    rng = make_rng(seed)
+    if plan["rank"] != RANK_EV or not candidates:
+        return finish_cpu_tenpai(plan, rng=rng)
+    chunks = min(pool.workers, len(candidates))
+    results = await asyncio.gather(*(
+        run_in_pool(evaluate_candidates, candidates[n::chunks], plan["pool"], plan["seen"],
+                    plan["dora"], plan["evalBudgetMs"])
+        for n in range(chunks)
+    ))
+    evaluations = [None] * len(candidates)
+    for n, chunk in enumerate(results):
+        evaluations[n::chunks] = chunk
+    return finish_cpu_tenpai(plan, evaluations, rng)
+
+# CPU聴牌形生成エンドポイント（難易度に応じて期待値で13枚を選ぶ）
 @app.post("/api/generate-cpu-tenpai")
 async def generate_cpu_tenpai_endpoint(request: GenerateCpuTenpaiRequest):
     try:
@@ -96,11 +441,78 @@ async def generate_cpu_tenpai_endpoint(request: GenerateCpuTenpaiRequest):
         if not request.dora:
             raise HTTPException(status_code=400, detail="ドラ表示牌が指定されていません")
         
-        result = generate_cpu_tenpai(request.tiles, request.dora, request.forceChiitoitsu)
-        return result
+        difficulty = request.difficulty or (None if request.rank else DEFAULT_DIFFICULTY)
+        args = (request.tiles, request.dora, request.forceChiitoitsu, request.rank or "width",
+                request.timeBudgetMs, difficulty)
+        if pool.workers <= 1:
+            return await run_in_pool(generate_cpu_tenpai, *args, request.seed)
+        return await generate_cpu_tenpai_parallel(*args, seed=request.seed)
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"CPU聴牌形生成エラー: {str(e)}")
 
+def get_session(session_id):
+    try:
+        return session_store.get(session_id)
+    except SessionNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+# セッション作成エンドポイント（局の開始時にドラ表示牌を固定する）
+@app.post("/api/sessions")
+async def create_session_endpoint(request: CreateSessionRequest):
+    try:
+        session = create_session(session_store, request.dora, parse_rules(request.rules))
+        return session.to_dict()
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/api/sessions/{session_id}")
+async def get_session_endpoint(session_id: str):
+    return get_session(session_id).to_dict()
+
+@app.delete("/api/sessions/{session_id}")
+async def delete_session_endpoint(session_id: str):
+    try:
+        session_store.delete(session_id)
+    except SessionNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    return {"deleted": True}
+
+# 手牌登録エンドポイント（待ちごとの和了判定をここでまとめて行う）
+@app.post("/api/sessions/{session_id}/hands")
+async def register_hand_endpoint(session_id: str, request: RegisterHandRequest):
+    try:
+        hand = parse_request_hand(request.tiles)
+        session = get_session(session_id)
+        waits = await run_in_pool(score_waits, hand, session.dora, session.rule)
+        # 判定を待つ間に削除・期限切れになったセッションを保存し直さないよう、取り直してから登録する
+        session = get_session(session_id)
+        result = session.register_hand(request.seat, hand, waits)
+        session_store.put(session)
+        return result
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"手牌登録エラー: {str(e)}")
+
+# 捨て牌エンドポイント（登録済みの他の席のロン和了を待ちの表から判定する）
+@app.post("/api/sessions/{session_id}/discards")
+async def discard_endpoint(session_id: str, request: DiscardRequest):
+    try:
+        session = get_session(session_id)
+        result = session.discard(request.seat, request.tile)
+        session_store.put(session)
+        return result
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 if __name__ == "__main__":
     import uvicorn
     # Renderは環境変数PORTを自動設定する
@@ -1,6 +1,5 @@
 import { NextRequest, NextResponse } from 'next/server';
-import { spawn } from 'child_process';
-import path from 'path';
+import { callPythonWorker } from '@/app/lib/python-worker-pool';
 
 interface TenpaiCheckRequest {
   tiles: string[];
@@ -13,45 +12,9 @@ interface TenpaiCheckResponse {
   error?: string;
 }
 
-// Pythonスクリプトを実行して聴牌判定（ローカル開発環境用）
+// 常駐Pythonワーカーで聴牌判定（ローカル開発環境用）
 async function checkTenpaiWithPythonLocal(tiles: string[], dora: string): Promise<TenpaiCheckResponse> {
-  return new Promise<TenpaiCheckResponse>((resolve, reject) => {
-    const pythonScript = path.join(process.cwd(), 'python', 'tenpai_checker.py');
-
-    const inputData = JSON.stringify({
-      tiles: tiles,
-      dora: dora
-    });
-
-    const python = spawn('python', [pythonScript, inputData]);
-
-    let output = '';
-    let errorOutput = '';
-
-    python.stdout.on('data', (data) => {
-      output += data.toString();
-    });
-
-    python.stderr.on('data', (data) => {
-      errorOutput += data.toString();
-    });
-
-    python.on('close', (code) => {
-      if (code !== 0) {
-        console.error('Python script error:', errorOutput);
-        reject(new Error(`Python script failed with code ${code}: ${errorOutput}`));
-        return;
-      }
-
-      try {
-        const result = JSON.parse(output.trim());
-        resolve(result);
-      } catch {
-        console.error('Failed to parse Python output:', output);
-        reject(new Error('Failed to parse Python script output'));
-      }
-    });
-  });
+  return callPythonWorker<TenpaiCheckResponse>('tenpai_checker.py', { tiles, dora });
 }
 
 // RenderのPython APIサーバーを呼び出す（本番環境用）
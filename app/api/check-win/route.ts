@@ -1,6 +1,5 @@
 import { NextRequest, NextResponse } from 'next/server';
-import { spawn } from 'child_process';
-import path from 'path';
+import { callPythonWorker } from '@/app/lib/python-worker-pool';
 
 interface WinCheckRequest {
   tiles: string[];      // 手牌
@@ -16,49 +15,9 @@ interface WinCheckResponse {
   fu?: number;           // 符数
 }
 
-// Pythonスクリプトを実行して和了判定（ローカル開発環境用）
+// 常駐Pythonワーカーで和了判定（ローカル開発環境用）
 async function checkWinWithPythonLocal(tiles: string[], lastTile: string, dora: string): Promise<WinCheckResponse> {
-  return new Promise<WinCheckResponse>((resolve, reject) => {
-    const pythonScript = path.join(process.cwd(), 'python', 'mahjong_checker.py');
-
-    const inputData = JSON.stringify({
-      tiles: tiles,
-      lastTile: lastTile,
-      dora: dora
-    });
-
-    console.log('Python script input:', inputData);
-
-    const python = spawn('python', [pythonScript, inputData]);
-
-    let output = '';
-    let errorOutput = '';
-
-    python.stdout.on('data', (data) => {
-      output += data.toString();
-    });
-
-    python.stderr.on('data', (data) => {
-      errorOutput += data.toString();
-    });
-
-    python.on('close', (code) => {
-      if (code !== 0) {
-        console.error('Python script error:', errorOutput);
-        reject(new Error(`Python script failed with code ${code}: ${errorOutput}`));
-        return;
-      }
-
-      try {
-        console.log('Python script output:', output.trim());
-        const result = JSON.parse(output.trim());
-        resolve(result);
-      } catch {
-        console.error('Failed to parse Python output:', output);
-        reject(new Error('Failed to parse Python script output'));
-      }
-    });
-  });
+  return callPythonWorker<WinCheckResponse>('mahjong_checker.py', { tiles, lastTile, dora });
 }
 
 // RenderのPython APIサーバーを呼び出す（本番環境用）
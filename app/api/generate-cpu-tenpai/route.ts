@@ -1,38 +1,9 @@
 import { NextRequest, NextResponse } from 'next/server';
-import { spawn } from 'child_process';
-import path from 'path';
+import { callPythonWorker } from '@/app/lib/python-worker-pool';
 
-// Pythonスクリプトを実行（ローカル開発環境用）
+// 常駐Pythonワーカーで実行（ローカル開発環境用）
 async function generateCpuTenpaiLocal(tiles: string[], dora: string, forceChiitoitsu: boolean) {
-  return new Promise((resolve, reject) => {
-    const pythonScriptPath = path.join(process.cwd(), 'python', 'cpu_tenpai_generator.py');
-
-    const pythonProcess = spawn('python', [pythonScriptPath, JSON.stringify({ tiles, dora, forceChiitoitsu })]);
-
-    let output = '';
-    let errorOutput = '';
-
-    pythonProcess.stdout.on('data', (data) => {
-      output += data.toString();
-    });
-
-    pythonProcess.stderr.on('data', (data) => {
-      errorOutput += data.toString();
-    });
-
-    pythonProcess.on('close', (code) => {
-      if (code === 0) {
-        try {
-          const result = JSON.parse(output);
-          resolve(result);
-        } catch (parseError) {
-          reject(new Error(`Failed to parse Python output: ${output}`));
-        }
-      } else {
-        reject(new Error(`Python process failed: ${errorOutput}`));
-      }
-    });
-  });
+  return callPythonWorker('cpu_tenpai_generator.py', { tiles, dora, forceChiitoitsu });
 }
 
 // RenderのPython APIサーバーを呼び出す（本番環境用）
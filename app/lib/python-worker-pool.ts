@@ -0,0 +1,142 @@
+// 常駐Pythonワーカーのプール（ローカル開発環境用）
+// リクエストごとにPythonを起動する代わりに `--worker` モードのプロセスを使い回す
+
+import { spawn, ChildProcessWithoutNullStreams } from 'child_process';
+import path from 'path';
+
+interface PendingRequest {
+  resolve: (value: unknown) => void;
+  reject: (reason: Error) => void;
+  timer: NodeJS.Timeout;
+}
+
+interface PythonWorker {
+  process: ChildProcessWithoutNullStreams;
+  pending: Map<number, PendingRequest>;
+  buffer: string;
+}
+
+interface WorkerResponse {
+  id: number;
+  result?: unknown;
+  error?: string;
+}
+
+interface WorkerPoolState {
+  pools: Map<string, PythonWorker[]>;
+  nextRequestId: number;
+}
+
+// スクリプトごとのワーカー数（環境変数で変更可能）
+const POOL_SIZE = Number(process.env.PYTHON_WORKER_POOL_SIZE) || 2;
+const REQUEST_TIMEOUT_MS = Number(process.env.PYTHON_WORKER_TIMEOUT_MS) || 10000;
+
+// 開発サーバーのホットリロードでプロセスが増え続けないようにglobalThisに保持する
+const globalForWorkers = globalThis as typeof globalThis & { pythonWorkerPool?: WorkerPoolState };
+const state: WorkerPoolState = globalForWorkers.pythonWorkerPool ??= {
+  pools: new Map(),
+  nextRequestId: 0,
+};
+
+function handleLine(worker: PythonWorker, line: string) {
+  if (!line.trim()) return;
+
+  let response: WorkerResponse;
+  try {
+    response = JSON.parse(line);
+  } catch {
+    console.error('Failed to parse Python worker output:', line);
+    return;
+  }
+
+  const request = worker.pending.get(response.id);
+  if (!request) return;
+  worker.pending.delete(response.id);
+  clearTimeout(request.timer);
+
+  if (response.error !== undefined) request.reject(new Error(`Python worker error: ${response.error}`));
+  else request.resolve(response.result);
+}
+
+function removeWorker(script: string, worker: PythonWorker, reason: string) {
+  const pool = state.pools.get(script);
+  if (pool) state.pools.set(script, pool.filter((w) => w !== worker));
+
+  for (const [id, request] of worker.pending) {
+    clearTimeout(request.timer);
+    request.reject(new Error(reason));
+    worker.pending.delete(id);
+  }
+}
+
+function startWorker(script: string): PythonWorker {
+  const pythonScript = path.join(process.cwd(), 'python', script);
+  const child = spawn('python', [pythonScript, '--worker']);
+  const worker: PythonWorker = { process: child, pending: new Map(), buffer: '' };
+
+  // 複数バイトの文字（発・中など）がチャンクの境目で分かれても壊れないよう、ストリーム側でデコードする
+  child.stdout.setEncoding('utf8');
+  child.stdout.on('data', (data: string) => {
+    worker.buffer += data;
+    const lines = worker.buffer.split('\n');
+    worker.buffer = lines.pop() ?? '';
+    lines.forEach((line) => handleLine(worker, line));
+  });
+
+  child.stderr.setEncoding('utf8');
+  child.stderr.on('data', (data) => {
+    console.error(`Python worker (${script}) stderr:`, data.toString());
+  });
+
+  // 終了済み・起動に失敗したプロセスへの書き込み（EPIPE など）は未処理の例外にせず、ワーカーを外す
+  child.stdin.on('error', (error) => {
+    removeWorker(script, worker, `Python worker (${script}) stdin error: ${error.message}`);
+    child.kill();
+  });
+  child.on('error', (error) => removeWorker(script, worker, `Python worker failed to start: ${error.message}`));
+  child.on('exit', (code) => removeWorker(script, worker, `Python worker exited with code ${code}`));
+
+  return worker;
+}
+
+// 処理中のリクエストが最も少ないワーカーを選ぶ（足りなければ起動する）
+function acquireWorker(script: string): PythonWorker {
+  const pool = state.pools.get(script) ?? [];
+  state.pools.set(script, pool);
+
+  if (pool.length < POOL_SIZE) {
+    const idleWorker = pool.find((w) => w.pending.size === 0);
+    if (idleWorker) return idleWorker;
+    const worker = startWorker(script);
+    pool.push(worker);
+    return worker;
+  }
+
+  return pool.reduce((least, w) => (w.pending.size < least.pending.size ? w : least));
+}
+
+// Pythonワーカーにリクエストを送り、同じidの応答を待つ
+export function callPythonWorker<T>(script: string, payload: object, timeoutMs = REQUEST_TIMEOUT_MS): Promise<T> {
+  return new Promise<T>((resolve, reject) => {
+    const worker = acquireWorker(script);
+    const id = ++state.nextRequestId;
+
+    const child = worker.process;
+    if (child.exitCode !== null || child.killed || !child.stdin.writable) {
+      removeWorker(script, worker, `Python worker (${script}) is not running`);
+      reject(new Error(`Python worker (${script}) is not running`));
+      return;
+    }
+
+    const timer = setTimeout(() => {
+      worker.pending.delete(id);
+      reject(new Error(`Python worker (${script}) timed out after ${timeoutMs}ms`));
+      // 応答しないプロセスを使い続けると後続のリクエストも待たされるので、終了させて次回は新しく起動する
+      removeWorker(script, worker, `Python worker (${script}) was restarted after a timeout`);
+      child.kill();
+    }, timeoutMs);
+
+    worker.pending.set(id, { resolve: resolve as (value: unknown) => void, reject, timer });
+    child.stdin.write(JSON.stringify({ ...payload, id }) + '\n');
+  });
+}
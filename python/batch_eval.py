@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+N×34の枚数行列をまとめて和了形・待ち牌判定する（オフラインの大量シミュレーション用）
+
+行列は tile_codec.encode_batch と同じ行優先のバイト列（1行34バイト）、
+またはnumpyの (N, 34) 配列で渡す。行ごとに
+  14枚: 和了形なら勝ちフラグ1
+  13枚: 待ち牌のビットマスク（ビットiが34種インデックスiの待ち、4枚使い切りの牌は除く）
+を返す。それ以外の枚数・5枚以上の牌を含む行は 0 になる。
+判定は hand_shape の is_winning_shape / find_waits と同じ（点数計算・役の有無は見ない）。
+
+numpyがあれば各グループのキーを行列積で求めて分解テーブルを二分探索でまとめて引き、
+無ければグループの枚数パターンごとにテーブル参照結果を辞書に覚えて1行ずつ組み合わせる。
+大きな入力は chunk_rows 行ずつ処理するため、作業用のメモリはチャンクの大きさで抑えられる。
+"""
+
+import os
+from array import array
+
+from hand_shape import TERMINAL_HONOR_INDICES
+from suit_table import (
+    COMPLETE, COMPLETE_WITH_PAIR, HONOR_KEY_BASE, WAIT_MASK, WAIT_SHIFT, WAIT_WITH_PAIR_SHIFT, get_table
+)
+from tile_codec import TILE_NAMES
+
+try:
+    import numpy as np
+except ImportError:  # numpyは任意（無ければ純Pythonで処理する）
+    np = None
+
+# 1チャンクの行数（環境変数で変更可能）
+DEFAULT_CHUNK_ROWS = int(os.environ.get("MAHJONG_BATCH_CHUNK_ROWS", 32768))
+
+# 么九牌13種すべてのビット
+_KOKUSHI_MASK = sum(1 << i for i in TERMINAL_HONOR_INDICES)
+
+# グループの枚数パターン→テーブルのエントリ（純Python処理用、上限を超えたら作り直す）
+_ENTRY_CACHE_LIMIT = 1 << 18
+_entry_cache = {}
+
+
+def has_numpy():
+    return np is not None
+
+
+def mask_to_indices(mask):
+    """
+    待ち牌のビットマスクを34種インデックスのリストに変換
+    """
+    return [i for i in range(34) if mask >> i & 1]
+
+
+def mask_to_tiles(mask):
+    """
+    待ち牌のビットマスクを牌文字列のリストに変換
+    """
+    return [TILE_NAMES[i] for i in mask_to_indices(mask)]
+
+
+# ---- 純Pythonでの処理 ----
+
+def _entry(key):
+    """
+    グループの枚数パターン（bytes、長さ9は数牌・7は字牌）のテーブルエントリ
+    """
+    entry = _entry_cache.get(key)
+    if entry is None:
+        if len(_entry_cache) >= _ENTRY_CACHE_LIMIT:
+            _entry_cache.clear()
+        table = get_table()
+        entry = table.suit(key) if len(key) == 9 else table.honors(key)
+        _entry_cache[key] = entry
+    return entry
+
+
+def _row_result(row):
+    """
+    1行（34バイト）の (勝ちフラグ, 待ち牌マスク)
+    """
+    total = sum(row)
+    if (total != 13 and total != 14) or max(row) > 4:
+        return 0, 0
+    entries = (_entry(row[0:9]), _entry(row[9:18]), _entry(row[18:27]), _entry(row[27:34]))
+    # 0: 面子のみで完成, 1: 雀頭込みで完成, None: 未完成
+    states = [0 if e & COMPLETE else 1 if e & COMPLETE_WITH_PAIR else None for e in entries]
+
+    if total == 14:
+        if None not in states and sum(states) == 1:
+            return 1, 0
+        if row.count(2) == 7:
+            return 1, 0
+        terminals = [row[i] for i in TERMINAL_HONOR_INDICES]
+        return (1 if 0 not in terminals and sum(terminals) == 14 else 0), 0
+
+    mask = 0
+    for g in range(4):
+        others = [states[o] for o in range(4) if o != g]
+        if None in others:
+            continue
+        pairs = sum(others)
+        if pairs == 1:
+            mask |= ((entries[g] >> WAIT_SHIFT) & WAIT_MASK) << (g * 9)
+        elif pairs == 0:
+            mask |= ((entries[g] >> WAIT_WITH_PAIR_SHIFT) & WAIT_MASK) << (g * 9)
+
+    # 七対子（異なる6種の対子+単騎）
+    if row.count(2) == 6 and row.count(1) == 1:
+        mask |= 1 << row.index(1)
+    # 国士無双（13面待ち、または欠けている1種）
+    terminals = [row[i] for i in TERMINAL_HONOR_INDICES]
+    if sum(terminals) == 13:
+        missing = [i for i, c in zip(TERMINAL_HONOR_INDICES, terminals) if c == 0]
+        if not missing:
+            mask |= _KOKUSHI_MASK
+        elif len(missing) == 1:
+            mask |= 1 << missing[0]
+
+    # 4枚使い切っている牌は待ちにしない
+    for i in range(34):
+        if row[i] == 4:
+            mask &= ~(1 << i)
+    return 0, mask
+
+
+def _evaluate_chunk_python(chunk):
+    rows = len(chunk) // 34
+    wins = bytearray(rows)
+    waits = array('q', bytes(8 * rows))
+    for r in range(rows):
+        wins[r], waits[r] = _row_result(chunk[r * 34:r * 34 + 34])
+    return wins, waits
+
+
+# ---- numpyでの処理 ----
+
+_numpy_tables = None
+
+
+def _numpy_table():
+    """
+    分解テーブルのキー・値をnumpy配列として取得（mmapの内容をコピーせずに参照する）
+    """
+    global _numpy_tables
+    if _numpy_tables is None:
+        table_keys, table_values = get_table().arrays()
+        keys = np.asarray(table_keys, dtype=np.int64)
+        values = np.asarray(table_values, dtype=np.int64)
+        suit_powers = 5 ** np.arange(9, dtype=np.int64)
+        bit_values = np.left_shift(np.int64(1), np.arange(34, dtype=np.int64))
+        _numpy_tables = (keys, values, suit_powers, bit_values)
+    return _numpy_tables
+
+
+def _lookup_numpy(keys, values, query):
+    position = np.searchsorted(keys, query)
+    position = np.minimum(position, len(keys) - 1)
+    return np.where(keys[position] == query, values[position], 0)
+
+
+def _evaluate_chunk_numpy(chunk):
+    keys, values, suit_powers, bit_values = _numpy_table()
+    if not isinstance(chunk, np.ndarray):
+        chunk = np.frombuffer(chunk, dtype=np.uint8)
+    counts = chunk.reshape(-1, 34).astype(np.int64)
+    rows = counts.shape[0]
+    total = counts.sum(axis=1)
+    valid = ((total == 13) | (total == 14)) & (counts.max(axis=1, initial=0) <= 4)
+
+    entries = [
+        _lookup_numpy(keys, values, counts[:, g * 9:g * 9 + 9] @ suit_powers) for g in range(3)
+    ] + [
+        _lookup_numpy(keys, values, counts[:, 27:34] @ suit_powers[:7] + HONOR_KEY_BASE)
+    ]
+    complete = [(e & COMPLETE) != 0 for e in entries]
+    with_pair = [(e & COMPLETE_WITH_PAIR) != 0 for e in entries]
+    done = [c | p for c, p in zip(complete, with_pair)]
+
+    pairs = (counts == 2).sum(axis=1)
+    singles = (counts == 1).sum(axis=1)
+    terminals = counts[:, list(TERMINAL_HONOR_INDICES)]
+    terminal_total = terminals.sum(axis=1)
+    terminal_missing = (terminals == 0).sum(axis=1)
+
+    # 14枚: 和了形
+    standard_win = done[0] & done[1] & done[2] & done[3] & (sum(p.astype(np.int64) for p in with_pair) == 1)
+    kokushi_win = (terminal_missing == 0) & (terminal_total == 14)
+    wins = valid & (total == 14) & (standard_win | (pairs == 7) | kokushi_win)
+
+    # 13枚: 待ち牌マスク
+    waits = np.zeros(rows, dtype=np.int64)
+    for g in range(4):
+        others = [o for o in range(4) if o != g]
+        others_done = done[others[0]] & done[others[1]] & done[others[2]]
+        others_pairs = sum(with_pair[o].astype(np.int64) for o in others)
+        bits = np.where(
+            others_pairs == 1, (entries[g] >> WAIT_SHIFT) & WAIT_MASK,
+            np.where(others_pairs == 0, (entries[g] >> WAIT_WITH_PAIR_SHIFT) & WAIT_MASK, 0)
+        )
+        waits |= np.where(others_done, bits << (g * 9), 0)
+
+    chiitoitsu = (pairs == 6) & (singles == 1)
+    single_bit = bit_values[np.argmax(counts == 1, axis=1)]
+    waits |= np.where(chiitoitsu, single_bit, 0)
+
+    kokushi = terminal_total == 13
+    missing_bit = ((terminals == 0) * bit_values[list(TERMINAL_HONOR_INDICES)]).sum(axis=1)
+    waits |= np.where(kokushi & (terminal_missing == 0), _KOKUSHI_MASK, 0)
+    waits |= np.where(kokushi & (terminal_missing == 1), missing_bit, 0)
+
+    waits &= ~((counts == 4) @ bit_values)
+    waits = np.where(valid & (total == 13), waits, 0)
+    return wins.astype(np.uint8), waits
+
+
+# ---- 入口 ----
+
+def _chunks(source, chunk_rows):
+    """
+    バイト列・numpy配列・ファイルオブジェクトから chunk_rows 行ずつ取り出す
+    """
+    if hasattr(source, 'read'):
+        while True:
+            chunk = source.read(chunk_rows * 34)
+            if not chunk:
+                return
+            if len(chunk) % 34:
+                raise ValueError("枚数行列の長さが34の倍数ではありません")
+            yield chunk
+        return
+
+    if np is not None and isinstance(source, np.ndarray):
+        matrix = source.reshape(-1, 34)
+        for start in range(0, matrix.shape[0], chunk_rows):
+            yield matrix[start:start + chunk_rows]
+        return
+
+    view = memoryview(source).cast('B')
+    if len(view) % 34:
+        raise ValueError("枚数行列の長さが34の倍数ではありません")
+    step = chunk_rows * 34
+    for start in range(0, len(view), step):
+        yield view[start:start + step]
+
+
+def iter_evaluate(source, chunk_rows=None, use_numpy=None):
+    """
+    枚数行列をチャンクごとに判定し、(開始行, 勝ちフラグ, 待ち牌マスク) を順に返す
+
+    use_numpy=None ならnumpyがあれば使う。結果の型はnumpy使用時は配列、
+    それ以外は bytearray と array('q')。
+    """
+    chunk_rows = chunk_rows or DEFAULT_CHUNK_ROWS
+    if use_numpy and np is None:
+        raise RuntimeError("numpyがインストールされていません")
+    numpy_path = np is not None if use_numpy is None else use_numpy
+
+    start = 0
+    for chunk in _chunks(source, chunk_rows):
+        if numpy_path:
+            wins, waits = _evaluate_chunk_numpy(chunk)
+        else:
+            # 1行ずつの処理ではbytesのスライス・count・indexを使う
+            if np is not None and isinstance(chunk, np.ndarray):
+                chunk = np.ascontiguousarray(chunk, dtype=np.uint8).tobytes()
+            wins, waits = _evaluate_chunk_python(bytes(chunk))
+        yield start, wins, waits
+        start += len(wins)
+
+
+def evaluate_matrix(source, chunk_rows=None, use_numpy=None):
+    """
+    枚数行列全体を判定し、(勝ちフラグ, 待ち牌マスク) をまとめて返す
+
+    結果だけで1行あたり9バイトを使うため、数百万行を超える場合は iter_evaluate で順に処理する。
+    """
+    win_parts = []
+    wait_parts = []
+    for _, wins, waits in iter_evaluate(source, chunk_rows, use_numpy):
+        win_parts.append(wins)
+        wait_parts.append(waits)
+
+    if np is not None and win_parts and isinstance(win_parts[0], np.ndarray):
+        return np.concatenate(win_parts), np.concatenate(wait_parts)
+    all_wins = bytearray()
+    all_waits = array('q')
+    for wins, waits in zip(win_parts, wait_parts):
+        all_wins += wins
+        all_waits.extend(waits)
+    return all_wins, all_waits
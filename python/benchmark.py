@@ -0,0 +1,487 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+判定処理のベンチマーク
+
+固定シードで作った手牌コーパス（聴牌・非聴牌・七対子・多面待ち・国士無双形・34枚の配牌）に対して
+check_win・2つの check_tenpai・generate_cpu_tenpai の1回あたりの処理時間の分布とスループットを測り、
+api_server.py もプロセス内のASGIクライアントでリクエスト単位のスループットを測る。
+Vercelのハンドラ（api/*.py）は新しいプロセスで読み込む時間（コールドスタート）と、
+`-X importtime` で読み込まれたモジュール数・自身の読み込み時間が長いモジュールを記録する。
+結果はJSONで保存し、--compare で保存済みの結果と比べて悪化した項目を報告する。
+
+使い方:
+  python benchmark.py --output bench.json
+  python benchmark.py --compare bench.json --threshold 0.15
+  python benchmark.py --only check_win,generate_cpu_tenpai
+
+既定では判定結果キャッシュを無効にして計算そのものを測る（--cache で有効のまま測る）。
+"""
+
+import argparse
+import asyncio
+import glob
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+
+from tile_codec import TILE_NAMES, tiles_to_counts
+
+# 山（34種×4枚）
+_WALL = tuple(tile for tile in TILE_NAMES for _ in range(4))
+# 面子（刻子34種+順子21種）
+_MELDS = tuple((i, i, i) for i in range(34)) + tuple(
+    (s + n, s + n + 1, s + n + 2) for s in (0, 9, 18) for n in range(7)
+)
+_TERMINAL_HONOR_INDICES = (0, 8, 9, 17, 18, 26, 27, 28, 29, 30, 31, 32, 33)
+
+CORPORA = ('tenpai', 'non_tenpai', 'chiitoitsu', 'multi_wait', 'kokushi')
+
+# 比較する指標（値が大きいほど悪い指標・小さいほど悪い指標、p99・最大値はぶれが大きいため見ない）
+_HIGHER_IS_WORSE = ('p50Ms', 'p90Ms', 'importedModules')
+_LOWER_IS_WORSE = ('throughput',)
+
+
+# ---- コーパス ----
+
+def _complete_counts(rng):
+    """
+    4面子1雀頭の14枚（枚数ベクトル）を無作為に作る
+    """
+    while True:
+        counts = [0] * 34
+        for meld in rng.sample(_MELDS, 4):
+            for i in meld:
+                counts[i] += 1
+        pair = rng.randrange(34)
+        counts[pair] += 2
+        if max(counts) <= 4:
+            return counts
+
+
+def _counts_to_tiles(counts):
+    return [TILE_NAMES[i] for i, c in enumerate(counts) for _ in range(c)]
+
+
+def _remove_random(rng, counts):
+    """
+    14枚から1枚抜いて (13枚の牌リスト, 抜いた牌) を返す
+    """
+    tiles = _counts_to_tiles(counts)
+    last = tiles.pop(rng.randrange(len(tiles)))
+    return tiles, last
+
+
+def _item(rng, tiles, last):
+    return {"tiles": tiles, "lastTile": last, "dora": rng.choice(TILE_NAMES)}
+
+
+def _tenpai(rng):
+    return _item(rng, *_remove_random(rng, _complete_counts(rng)))
+
+
+def _multi_wait(rng):
+    from hand_shape import find_waits
+    while True:
+        tiles, last = _remove_random(rng, _complete_counts(rng))
+        if len(find_waits(tiles_to_counts(tiles))) >= 3:
+            return _item(rng, tiles, last)
+
+
+def _non_tenpai(rng):
+    from hand_shape import find_waits
+    while True:
+        tiles = rng.sample(_WALL, 13)
+        if not find_waits(tiles_to_counts(tiles)):
+            return _item(rng, tiles, rng.choice(TILE_NAMES))
+
+
+def _chiitoitsu(rng):
+    counts = [0] * 34
+    for i in rng.sample(range(34), 7):
+        counts[i] = 2
+    return _item(rng, *_remove_random(rng, counts))
+
+
+def _kokushi(rng):
+    counts = [0] * 34
+    for i in _TERMINAL_HONOR_INDICES:
+        counts[i] = 1
+    counts[rng.choice(_TERMINAL_HONOR_INDICES)] += 1
+    return _item(rng, *_remove_random(rng, counts))
+
+
+_BUILDERS = {
+    'tenpai': _tenpai,
+    'non_tenpai': _non_tenpai,
+    'chiitoitsu': _chiitoitsu,
+    'multi_wait': _multi_wait,
+    'kokushi': _kokushi,
+}
+
+
+def build_corpora(seed=0, size=200, pools=20):
+    """
+    固定シードの手牌コーパス（種類ごとに size 件）と、34枚の配牌 pools 件を作る
+    """
+    corpora = {}
+    for name in CORPORA:
+        rng = random.Random(f"{seed}:{name}")
+        corpora[name] = [_BUILDERS[name](rng) for _ in range(size)]
+    rng = random.Random(f"{seed}:pools")
+    corpora['pools'] = [
+        {"tiles": rng.sample(_WALL, 34), "dora": rng.choice(TILE_NAMES)} for _ in range(pools)
+    ]
+    return corpora
+
+
+# ---- 計測 ----
+
+def latency_stats(samples, elapsed=None):
+    """
+    1回あたりの処理時間（秒）の分布とスループット（回/秒）
+    """
+    ordered = sorted(samples)
+    count = len(ordered)
+
+    def percentile(p):
+        return ordered[min(count - 1, int(p * count))] * 1000
+
+    total = elapsed if elapsed is not None else sum(ordered)
+    return {
+        "count": count,
+        "meanMs": round(sum(ordered) / count * 1000, 4),
+        "p50Ms": round(percentile(0.50), 4),
+        "p90Ms": round(percentile(0.90), 4),
+        "p99Ms": round(percentile(0.99), 4),
+        "maxMs": round(ordered[-1] * 1000, 4),
+        "throughput": round(count / total, 2) if total else None
+    }
+
+
+# 計測前に空回しする件数（遅延読み込み・初回のテーブル参照を計測から外す）
+_WARMUP_ITEMS = 10
+
+
+def measure(func, items, repeat=1, before_each=None):
+    """
+    items の各要素で func を呼び、1回ずつの処理時間を測る
+    """
+    for item in items[:_WARMUP_ITEMS]:
+        func(item)
+    samples = []
+    clock = time.perf_counter
+    for _ in range(repeat):
+        for item in items:
+            if before_each is not None:
+                before_each()
+            started = clock()
+            func(item)
+            samples.append(clock() - started)
+    return latency_stats(samples)
+
+
+def _engine_benchmarks(corpora, repeat, cached):
+    from mahjong_engine import get_engine
+    import mahjong_checker
+    import tenpai_checker
+
+    engine = get_engine()
+    # キャッシュ無効の計測では毎回空にしてから呼ぶ（空にする時間は計測に含めない）
+    before_each = None if cached else engine.cache.clear
+    results = {}
+
+    for name in CORPORA:
+        results[f"check_win/{name}"] = measure(
+            lambda item: engine.check_win(item["tiles"], item["lastTile"], item["dora"]),
+            corpora[name], repeat, before_each)
+
+    mixed = corpora['tenpai'] + corpora['non_tenpai'] + corpora['multi_wait']
+    results["check_tenpai/tenpai_checker"] = measure(
+        lambda item: tenpai_checker.check_tenpai(item["tiles"], item["dora"]), mixed, repeat, before_each)
+    results["check_tenpai/mahjong_checker"] = measure(
+        lambda item: mahjong_checker.check_tenpai(item["tiles"]), mixed, repeat, before_each)
+    return results
+
+
+def _generator_benchmarks(corpora, repeat):
+    from cpu_strategy import DIFFICULTIES
+    from cpu_tenpai_generator import generate_cpu_tenpai
+    results = {
+        "generate_cpu_tenpai": measure(
+            lambda item: generate_cpu_tenpai(item["tiles"], item["dora"]), corpora['pools'], repeat)
+    }
+    # 難易度ごと（探索の深さと期待値評価の有無による処理時間の違い）
+    for name in DIFFICULTIES:
+        results[f"generate_cpu_tenpai_{name}"] = measure(
+            lambda item, name=name: generate_cpu_tenpai(item["tiles"], item["dora"], difficulty=name),
+            corpora['pools'], repeat)
+    return results
+
+
+def _wire_benchmarks(corpora, repeat):
+    """
+    応答のJSON（標準のjson・orjson）とコンパクト形式の変換時間・大きさ
+    """
+    import wire_format
+    from mahjong_engine import get_engine
+    engine = get_engine()
+
+    wins = [engine.check_win(item["tiles"], item["lastTile"], item["dora"])
+            for name in CORPORA for item in corpora[name]]
+    tenpai = [engine.check_tenpai(item["tiles"], item["dora"]) for item in corpora['tenpai']]
+    payloads = {
+        "check_win": wins,
+        "check_tenpai": tenpai,
+        # バッチ判定の応答（32件ずつ）
+        "check_win_batch": [{"results": wins[i:i + 32]} for i in range(0, len(wins), 32)],
+    }
+
+    def to_json(value):
+        return json.dumps(value, ensure_ascii=False, allow_nan=False, indent=None,
+                          separators=(",", ":")).encode("utf-8")
+
+    results = {}
+    for name, values in payloads.items():
+        formats = [("json", to_json, json.loads), ("compact", wire_format.encode, wire_format.decode)]
+        if wire_format.orjson is not None:
+            formats.append(("orjson", wire_format.json_bytes, wire_format.orjson.loads))
+        for label, encode, decode in formats:
+            encoded = [encode(value) for value in values]
+            stats = measure(encode, values, repeat)
+            stats["meanBytes"] = round(sum(map(len, encoded)) / len(encoded), 1)
+            results[f"wire/{name}/{label}_encode"] = stats
+            results[f"wire/{name}/{label}_decode"] = measure(decode, encoded, repeat)
+    return results
+
+
+async def _api_throughput(client, path, payloads, concurrency):
+    """
+    payloads を concurrency 並列で送り、1リクエストごとの応答時間と全体の時間を測る
+    """
+    queue = list(payloads)
+    samples = []
+    failures = 0
+
+    async def worker():
+        nonlocal failures
+        while queue:
+            payload = queue.pop()
+            started = time.perf_counter()
+            response = await client.post(path, json=payload)
+            samples.append(time.perf_counter() - started)
+            if response.status_code != 200:
+                failures += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    stats = latency_stats(samples, time.perf_counter() - started)
+    stats["failures"] = failures
+    stats["concurrency"] = concurrency
+    return stats
+
+
+async def _api_benchmarks_async(corpora, repeat, concurrency):
+    import httpx
+    api_root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+    sys.path.insert(0, api_root)
+    import api_server
+
+    win_payloads = [dict(item) for name in CORPORA for item in corpora[name]] * repeat
+    tenpai_payloads = [{"tiles": item["tiles"], "dora": item["dora"]}
+                       for item in corpora['tenpai'] + corpora['non_tenpai']] * repeat
+    generate_payloads = list(corpora['pools']) * repeat
+
+    await api_server.startup()
+    try:
+        transport = httpx.ASGITransport(app=api_server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+            # プール起動・テーブル読み込みを計測から外す
+            await client.post("/api/check-win", json=win_payloads[0])
+            return {
+                "api/check-win": await _api_throughput(client, "/api/check-win", win_payloads, concurrency),
+                "api/check-tenpai": await _api_throughput(client, "/api/check-tenpai", tenpai_payloads, concurrency),
+                "api/generate-cpu-tenpai": await _api_throughput(
+                    client, "/api/generate-cpu-tenpai", generate_payloads, concurrency),
+            }
+    finally:
+        await api_server.shutdown()
+
+
+def _api_benchmarks(corpora, repeat, concurrency):
+    return asyncio.run(_api_benchmarks_async(corpora, repeat, concurrency))
+
+
+# ハンドラ1つあたりのコールドスタートの計測回数（--repeat 倍する）と、記録する遅いモジュールの数
+_IMPORT_RUNS = 5
+_IMPORT_TOP = 5
+
+# 新しいプロセスでハンドラを読み込み、読み込み時間と点数計算ライブラリの有無を標準出力に書く
+_IMPORT_SCRIPT = """
+import importlib.util, json, sys, time
+started = time.perf_counter()
+spec = importlib.util.spec_from_file_location("handler", sys.argv[1])
+spec.loader.exec_module(importlib.util.module_from_spec(spec))
+print(json.dumps({"seconds": time.perf_counter() - started, "mahjong": "mahjong" in sys.modules}))
+"""
+
+
+def _parse_importtime(stderr):
+    """
+    -X importtime の出力から（モジュール名, 自身の読み込み時間マイクロ秒）のリスト
+    """
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        self_us, _, name = line[len("import time:"):].split("|", 2)
+        if self_us.strip().isdigit():
+            modules.append((name.strip(), int(self_us)))
+    return modules
+
+
+def _import_benchmarks(repeat):
+    """
+    Vercelのハンドラをそれぞれ新しいプロセスで読み込む時間（コールドスタート）
+    """
+    api_root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'api')
+    # バイトコードのコンパイルを計測から外す（1回目で .pyc を書き出し、その回は記録しない）
+    env = {key: value for key, value in os.environ.items() if key != "PYTHONDONTWRITEBYTECODE"}
+    results = {}
+    for path in sorted(glob.glob(os.path.join(api_root, '*.py'))):
+        samples = []
+        for run in range(_IMPORT_RUNS * repeat + 1):
+            completed = subprocess.run(
+                [sys.executable, "-X", "importtime", "-c", _IMPORT_SCRIPT, path],
+                capture_output=True, text=True, check=True, env=env)
+            report = json.loads(completed.stdout.splitlines()[-1])
+            if run:
+                samples.append(report["seconds"])
+        modules = _parse_importtime(completed.stderr)
+        slowest = sorted(modules, key=lambda module: module[1], reverse=True)[:_IMPORT_TOP]
+        stats = latency_stats(samples)
+        stats["importedModules"] = len(modules)
+        stats["loadsScoringLibrary"] = report["mahjong"]
+        stats["slowestModules"] = [{"module": name, "selfMs": round(us / 1000, 3)} for name, us in slowest]
+        results[f"imports/{os.path.splitext(os.path.basename(path))[0]}"] = stats
+    return results
+
+
+# ---- 比較 ----
+
+def compare(current, baseline, threshold):
+    """
+    保存済みの結果と比べ、threshold（割合）を超えて悪化した指標を返す
+    """
+    regressions = []
+    for name, stats in current["results"].items():
+        base = baseline.get("results", {}).get(name)
+        if not base:
+            continue
+        for metric in _HIGHER_IS_WORSE + _LOWER_IS_WORSE:
+            old, new = base.get(metric), stats.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            worse = change > threshold if metric in _HIGHER_IS_WORSE else change < -threshold
+            if worse:
+                regressions.append({"benchmark": name, "metric": metric, "baseline": old,
+                                    "current": new, "change": round(change, 4)})
+    return regressions
+
+
+def _print_table(results, baseline=None):
+    print(f"{'benchmark':40} {'p50 ms':>10} {'p99 ms':>10} {'ops/s':>10} {'p50 diff':>10}")
+    for name, stats in results.items():
+        diff = ""
+        base = (baseline or {}).get("results", {}).get(name)
+        if base and base.get("p50Ms"):
+            diff = f"{(stats['p50Ms'] - base['p50Ms']) / base['p50Ms']:+.1%}"
+        print(f"{name:40} {stats['p50Ms']:>10.3f} {stats['p99Ms']:>10.3f} "
+              f"{stats['throughput'] or 0:>10.1f} {diff:>10}")
+
+
+def run(groups, seed, size, repeat, pools, concurrency, cached):
+    corpora = build_corpora(seed, size, pools)
+    results = {}
+    if 'check_win' in groups or 'check_tenpai' in groups:
+        engine_results = _engine_benchmarks(corpora, repeat, cached)
+        results.update({k: v for k, v in engine_results.items() if k.split('/')[0] in groups})
+    if 'generate_cpu_tenpai' in groups:
+        results.update(_generator_benchmarks(corpora, repeat))
+    if 'wire' in groups:
+        results.update(_wire_benchmarks(corpora, repeat))
+    if 'api' in groups:
+        results.update(_api_benchmarks(corpora, repeat, concurrency))
+    if 'imports' in groups:
+        results.update(_import_benchmarks(repeat))
+    return {
+        "meta": {
+            "seed": seed,
+            "size": size,
+            "repeat": repeat,
+            "pools": pools,
+            "concurrency": concurrency,
+            "cached": cached,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpuCount": os.cpu_count(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z")
+        },
+        "results": results
+    }
+
+
+GROUPS = ('check_win', 'check_tenpai', 'generate_cpu_tenpai', 'wire', 'api', 'imports')
+
+
+def main():
+    parser = argparse.ArgumentParser(description="判定処理のベンチマーク")
+    parser.add_argument("--output", help="結果を保存するJSONファイル")
+    parser.add_argument("--compare", help="比較する保存済みの結果（JSON）")
+    parser.add_argument("--threshold", type=float, default=0.10, help="悪化とみなす変化の割合（既定: 0.10）")
+    parser.add_argument("--only", default=",".join(GROUPS), help=f"実行する項目（カンマ区切り: {', '.join(GROUPS)}）")
+    parser.add_argument("--seed", type=int, default=0, help="コーパスの乱数シード")
+    parser.add_argument("--size", type=int, default=200, help="コーパス1種類あたりの手牌数")
+    parser.add_argument("--pools", type=int, default=20, help="generate_cpu_tenpai に使う配牌数")
+    parser.add_argument("--repeat", type=int, default=1, help="コーパスを繰り返す回数")
+    parser.add_argument("--concurrency", type=int, default=8, help="APIベンチマークの同時リクエスト数")
+    parser.add_argument("--cache", action="store_true", help="判定結果キャッシュを有効にしたまま測る")
+    args = parser.parse_args()
+
+    groups = [g.strip() for g in args.only.split(",") if g.strip()]
+    unknown = [g for g in groups if g not in GROUPS]
+    if unknown:
+        parser.error(f"不明な項目: {', '.join(unknown)}")
+    if not args.cache:
+        # ワーカープロセスの判定エンジンにも引き継がれるよう、読み込み前に設定する
+        os.environ["MAHJONG_CACHE_SIZE"] = "0"
+
+    report = run(groups, args.seed, args.size, args.repeat, args.pools, args.concurrency, args.cache)
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+    _print_table(report["results"], baseline)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"結果を {args.output} に保存しました")
+
+    if baseline is not None:
+        regressions = compare(report, baseline, args.threshold)
+        report["regressions"] = regressions
+        for r in regressions:
+            print(f"⚠️  {r['benchmark']} {r['metric']}: {r['baseline']} → {r['current']} ({r['change']:+.1%})")
+        if regressions:
+            sys.exit(1)
+        print("✅ 悪化した項目はありません")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+CPUの手牌選択の期待値評価
+
+GAME_RULES.md では手牌が局を通して固定で、CPUは相手の捨て牌（21枚）でのみ和了できる。
+そこで候補の13枚ごとに
+  和了率 = 見えていない牌から21枚が捨てられるまでに待ち牌が1枚以上出る確率（超幾何分布）
+  和了時の得点 = 待ち牌ごとの得点（飜数を addScore と同じ換算）を残り枚数で重み付けした平均
+を求め、その積（期待得点）で候補を順位付けする。
+待ちの残り枚数は自分の手持ち34枚とドラ（表示されている牌）を除いて数え、
+点数計算にはフロントエンドと同じくドラから1つ戻したドラ表示牌を渡す。
+
+難易度は探索の時間予算・評価する候補数・順位付けの組で、
+低い難易度ほど探索を浅くして速く、期待値を使わずに待ちの広さだけで選ぶ。
+"""
+
+import time
+from dataclasses import dataclass
+
+from hand_search import RANK_EV, RANK_WIDTH
+from metrics import stage
+from tile_codec import TILE_NAMES, counts_to_tiles, tile_to_index
+
+# 山の枚数と、相手が捨てる枚数（配牌34枚−手牌13枚）
+WALL_SIZE = 136
+DISCARD_COUNT = 21
+
+
+@dataclass(frozen=True)
+class Difficulty:
+    """
+    CPUの強さの設定
+    """
+    search_budget_ms: float  # 聴牌形探索の時間予算
+    top_k: int               # 探索で残す（期待値を評価する）候補数
+    rank: str                # 順位付けの基準
+    eval_budget_ms: float    # 期待値評価の時間予算
+
+
+DIFFICULTIES = {
+    'easy': Difficulty(search_budget_ms=50, top_k=4, rank=RANK_WIDTH, eval_budget_ms=0),
+    'normal': Difficulty(search_budget_ms=150, top_k=8, rank=RANK_EV, eval_budget_ms=100),
+    'hard': Difficulty(search_budget_ms=400, top_k=24, rank=RANK_EV, eval_budget_ms=300),
+}
+DEFAULT_DIFFICULTY = 'normal'
+
+
+def get_difficulty(name):
+    try:
+        return DIFFICULTIES[name]
+    except KeyError:
+        raise ValueError(f"不正な難易度: {name}") from None
+
+
+def han_to_points(han):
+    """
+    飜数を得点に換算（useMahjongDeal の addScore と同じ）
+    """
+    if han >= 13:
+        return 13
+    if han >= 11:
+        return 11
+    if han >= 8:
+        return 8
+    if han >= 6:
+        return 6
+    return max(1, min(han, 5))
+
+
+def win_probability(live, unseen, draws=DISCARD_COUNT):
+    """
+    見えていない unseen 枚から draws 枚が出るまでに、live 枚ある待ち牌が1枚以上出る確率
+    """
+    if live <= 0:
+        return 0.0
+    draws = min(draws, unseen)
+    miss = 1.0
+    for k in range(draws):
+        miss *= (unseen - live - k) / (unseen - k)
+        if miss <= 0.0:
+            return 1.0
+    return 1.0 - miss
+
+
+def dora_indicator(dora):
+    """
+    ドラからドラ表示牌を求める（useMahjongDeal の getDoraForPython と同じく1つ戻す）
+    """
+    index = tile_to_index(dora)
+    if index < 27:
+        suit_start = index - index % 9
+        return TILE_NAMES[suit_start + (index - suit_start - 1) % 9]
+    if index < 31:
+        return TILE_NAMES[27 + (index - 27 - 1) % 4]
+    return TILE_NAMES[31 + (index - 31 - 1) % 3]
+
+
+def evaluate_candidates(candidates, pool, seen, dora, budget_ms=None):
+    """
+    候補ごとの期待値評価のリスト（時間予算内に評価できなかった候補はNone）
+
+    pool は手持ちの枚数ベクトル、seen は手持ち以外で見えている牌の枚数ベクトル、
+    dora はドラ（表示牌ではない）。候補は良い順に並んでいる前提で先頭から評価する。
+    プロセスプールに渡せるよう、引数・戻り値はすべて組み込み型にしている。
+    """
+    from mahjong_engine import get_engine
+    engine = get_engine()
+    seen = seen or bytes(34)
+    indicator = dora_indicator(dora) if dora else None
+    unseen = WALL_SIZE - sum(pool) - sum(seen)
+    deadline = None if budget_ms is None else time.perf_counter() + budget_ms / 1000
+
+    evaluations = [None] * len(candidates)
+    with stage("evaluation"):
+        for n, candidate in enumerate(candidates):
+            # 先頭の候補は必ず評価し、それ以降は待ち1つごとに締め切りを確認する
+            evaluation = _evaluate(engine, candidate, pool, seen, indicator, unseen, deadline if n else None)
+            if evaluation is None:
+                break
+            evaluations[n] = evaluation
+    return evaluations
+
+
+def _evaluate(engine, candidate, pool, seen, indicator, unseen, deadline):
+    """
+    1候補の期待値評価（締め切りを過ぎたらNone）
+    """
+    hand = counts_to_tiles(candidate["counts"])
+    live_total = 0
+    weighted = 0
+    waits = []
+    for index in candidate["waits"]:
+        if deadline is not None and time.perf_counter() > deadline:
+            return None
+        live = max(0, 4 - pool[index] - seen[index])
+        result = engine.check_win(hand, TILE_NAMES[index], indicator)
+        if not result.get("isWinning"):
+            # 役の無い待ちでは和了できない
+            continue
+        live_total += live
+        weighted += live * han_to_points(result["han"])
+        waits.append(index)
+    probability = win_probability(live_total, unseen)
+    expected = weighted / live_total if live_total else 0.0
+    return {
+        "ev": round(probability * expected, 4),
+        "winProbability": round(probability, 4),
+        "expectedPoints": round(expected, 4),
+        "winningWaits": waits
+    }
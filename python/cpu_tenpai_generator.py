@@ -4,298 +4,264 @@
 import json
 import sys
 import random
-from collections import Counter
+from array import array
 
-def count_tiles(tiles):
-    """牌の枚数をカウント"""
-    return Counter(tiles)
+from cpu_strategy import DEFAULT_DIFFICULTY, dora_indicator, evaluate_candidates, get_difficulty
+from hand_search import (
+    ALL_FORMS, FORM_CHIITOITSU, RANK_EV, RANK_VALUE, RANK_WIDTH, SEARCH_TOP_K, search_tenpai_hands
+)
+from metrics import stage
+from shanten import ShantenState, chiitoitsu_shanten, standard_shanten
+from stdio_worker import is_worker_mode, serve
+from tile_codec import TILE_NAMES, counts_to_tiles, parse_hand, tile_to_index
 
-def find_sequences(tiles):
-    """順子を検出"""
-    sequences = []
-    tile_counts = count_tiles(tiles)
-    
-    # 数牌の順子を検索
-    for suit in ['m', 'p', 's']:
-        for i in range(1, 8):  # 1-7から順子開始
-            if (f"{i}{suit}" in tile_counts and 
-                f"{i+1}{suit}" in tile_counts and 
-                f"{i+2}{suit}" in tile_counts):
-                sequences.append([f"{i}{suit}", f"{i+1}{suit}", f"{i+2}{suit}"])
-    
-    return sequences
+# 内部では牌を34種の枚数ベクトル（array('B')、添字は tile_codec.TILE_NAMES の順）で扱い、
+# 牌文字列への変換は入力（parse_tiles）と出力（render_hand）の境界だけで行う
 
-def find_triplets(tiles):
-    """刻子を検出"""
-    triplets = []
-    tile_counts = count_tiles(tiles)
-    
-    for tile, count in tile_counts.items():
-        if count >= 3:
-            triplets.append([tile, tile, tile])
-    
-    return triplets
+# 手牌を選ぶ元の配牌の枚数
+POOL_SIZE = 34
 
-def find_pairs(tiles):
-    """対子を検出"""
-    pairs = []
-    tile_counts = count_tiles(tiles)
-    
-    for tile, count in tile_counts.items():
-        if count >= 2:
-            pairs.append([tile, tile])
-    
-    return pairs
+# シードを指定しない呼び出しで使う乱数生成器（プロセスごと）
+_default_rng = random.Random()
 
-def find_taatsu(tiles):
-    """ターツを検出"""
-    taatsu = []
-    tile_counts = count_tiles(tiles)
-    
-    # 数牌のターツ
-    for suit in ['m', 'p', 's']:
-        for i in range(1, 9):  # 1-8からターツ開始
-            if (f"{i}{suit}" in tile_counts and 
-                f"{i+1}{suit}" in tile_counts):
-                taatsu.append([f"{i}{suit}", f"{i+1}{suit}"])
-    
-    return taatsu
+def parse_tiles(tiles, dora=None):
+    """
+    配牌34枚とドラを検証し、枚数ベクトル・添字ごとの入力表記・見えている牌の枚数ベクトルに1回で変換
 
-def build_tenpai_hand(tiles):
-    """聴牌形を構築（面子3組 + 対子1組 + ターツ1組）- 貪欲法"""
-    try:
-        tile_counts = Counter(tiles)
-        hand = []
-        melds_count = 0
-        
-        # 1. 刻子を優先的に作る（最大3組）
-        tiles_list = list(tile_counts.keys())
-        random.shuffle(tiles_list)  # ランダム性を持たせる
-        
-        for tile in tiles_list:
-            if melds_count >= 3:
-                break
-            if tile_counts[tile] >= 3:
-                hand.extend([tile, tile, tile])
-                tile_counts[tile] -= 3
-                melds_count += 1
-        
-        # 2. 順子を作る（3組まで）
-        suits = ['m', 'p', 's']
-        random.shuffle(suits)  # ランダム性を持たせる
-        
-        for suit in suits:
-            if melds_count >= 3:
-                break
-            numbers = list(range(1, 8))
-            random.shuffle(numbers)  # ランダム性を持たせる
-            
-            for i in numbers:
-                if melds_count >= 3:
-                    break
-                if (tile_counts.get(f"{i}{suit}", 0) >= 1 and
-                    tile_counts.get(f"{i+1}{suit}", 0) >= 1 and
-                    tile_counts.get(f"{i+2}{suit}", 0) >= 1):
-                    hand.extend([f"{i}{suit}", f"{i+1}{suit}", f"{i+2}{suit}"])
-                    tile_counts[f"{i}{suit}"] -= 1
-                    tile_counts[f"{i+1}{suit}"] -= 1
-                    tile_counts[f"{i+2}{suit}"] -= 1
-                    melds_count += 1
-        
-        # 3組の面子が作れなかった場合は失敗
-        if melds_count < 3:
-            return random.sample(tiles, min(13, len(tiles)))
-        
-        # 3. 対子を作る（1組）
-        pair_added = False
-        remaining_tiles = list(tile_counts.keys())
-        random.shuffle(remaining_tiles)
-        
-        for tile in remaining_tiles:
-            if tile_counts[tile] >= 2:
-                hand.extend([tile, tile])
-                tile_counts[tile] -= 2
-                pair_added = True
-                break
-        
-        if not pair_added:
-            return random.sample(tiles, min(13, len(tiles)))
-        
-        # 4. ターツを作る（1組）
-        taatsu_added = False
-        suits_for_taatsu = ['m', 'p', 's']
-        random.shuffle(suits_for_taatsu)
-        
-        for suit in suits_for_taatsu:
-            if taatsu_added:
-                break
-            numbers_for_taatsu = list(range(1, 9))
-            random.shuffle(numbers_for_taatsu)
-            
-            for i in numbers_for_taatsu:
-                if (tile_counts.get(f"{i}{suit}", 0) >= 1 and
-                    tile_counts.get(f"{i+1}{suit}", 0) >= 1):
-                    hand.extend([f"{i}{suit}", f"{i+1}{suit}"])
-                    tile_counts[f"{i}{suit}"] -= 1
-                    tile_counts[f"{i+1}{suit}"] -= 1
-                    taatsu_added = True
-                    break
-        
-        if not taatsu_added:
-            return random.sample(tiles, min(13, len(tiles)))
-        
-        # 5. 13枚確認
-        if len(hand) != 13:
-            return random.sample(tiles, min(13, len(tiles)))
-        
-        return hand
-        
-    except Exception as e:
-        # エラー時はランダム13枚
-        return random.sample(tiles, min(13, len(tiles)))
+    牌の種類・同じ牌4枚まで・赤ドラ各色1枚まで・枚数は手牌と同じ tile_codec の検証を使う（不正なら ValueError）。
+    """
+    hand = parse_hand(tiles)
+    if len(hand) != POOL_SIZE:
+        raise ValueError(f"配牌は{POOL_SIZE}枚である必要があります")
+    counts = array('B', hand.counts)
+    names = list(TILE_NAMES)
+    named = [False] * 34
+    for tile in hand:
+        index = tile_to_index(tile)
+        if not named[index]:
+            # 発/發などの表記は入力に合わせて返す
+            names[index] = tile
+            named[index] = True
+    seen = None
+    if dora:
+        seen = array('B', bytes(34))
+        seen[tile_to_index(dora)] += 1
+    return counts, names, seen
 
-def build_chiitoitsu_hand(tiles):
-    """七対子を構築（対子6組 + 単騎1枚）- 貪欲法"""
-    try:
-        tile_counts = Counter(tiles)
-        hand = []
-        pairs_count = 0
-        
-        # 1. 対子を貪欲に作る（6組）
-        tiles_list = list(tile_counts.keys())
-        random.shuffle(tiles_list)  # ランダム性を持たせる
-        
-        for tile in tiles_list:
-            if pairs_count >= 6:
-                break
-            if tile_counts[tile] >= 2:
-                hand.extend([tile, tile])
-                tile_counts[tile] -= 2
-                pairs_count += 1
-        
-        # 対子が6組作れなかった場合は失敗
-        if pairs_count < 6:
-            return random.sample(tiles, min(13, len(tiles)))
-        
-        # 2. 単騎を作る（1枚）
-        # 残っている牌から1枚選択
-        tanki_candidates = []
-        for tile, count in tile_counts.items():
-            if count >= 1:
-                # 各牌を枚数分だけ候補に追加
-                tanki_candidates.extend([tile] * count)
-        
-        if not tanki_candidates:
-            return random.sample(tiles, min(13, len(tiles)))
-        
-        # ランダムに1枚選択
-        random.shuffle(tanki_candidates)
-        hand.append(tanki_candidates[0])
-        
-        # 3. 13枚確認
-        if len(hand) != 13:
-            return random.sample(tiles, min(13, len(tiles)))
-        
-        return hand
-        
-    except Exception as e:
-        # エラー時はランダム13枚
-        return random.sample(tiles, min(13, len(tiles)))
+def render_hand(counts, names=TILE_NAMES):
+    """枚数ベクトルを牌文字列のリストに戻す"""
+    return counts_to_tiles(counts, names)
 
-def validate_tile_usage(hand, available_tiles):
-    """牌の重複チェック（1枚しかないのに2枚以上使用していないか）"""
-    available_counts = count_tiles(available_tiles)
-    hand_counts = count_tiles(hand)
-    
-    for tile, count in hand_counts.items():
-        if count > available_counts.get(tile, 0):
-            return False
-    
-    return True
+def _hand_type(counts):
+    """聴牌形の種類"""
+    if standard_shanten(counts) == 0:
+        return "normal"
+    if chiitoitsu_shanten(counts) == 0:
+        return "chiitoitsu"
+    return "kokushi"
 
-def generate_cpu_tenpai(tiles, dora, force_chiitoitsu=False):
-    """CPU聴牌形を生成"""
-    try:
-        # 七対子強制作成フラグがTrueの場合は七対子のみ作成
-        if force_chiitoitsu:
-            chiitoitsu_hand = build_chiitoitsu_hand(tiles)
-            if validate_tile_usage(chiitoitsu_hand, tiles):
-                return {
-                    "success": True,
-                    "hand": chiitoitsu_hand,
-                    "type": "chiitoitsu_forced"
-                }
-            else:
-                # 七対子も失敗した場合はランダム
-                random_hand = random.sample(tiles, min(13, len(tiles)))
-                return {
-                    "success": True,
-                    "hand": random_hand,
-                    "type": "random_fallback"
-                }
-        
-        # 1. 面子・対子・ターツを検出して聴牌形を構築
-        tenpai_hand = build_tenpai_hand(tiles)
-        
-        # 2. 牌の重複チェック
-        if validate_tile_usage(tenpai_hand, tiles):
-            return {
-                "success": True,
-                "hand": tenpai_hand,
-                "type": "normal"
-            }
-        else:
-            # 3. 重複がある場合は七対子を作成
-            chiitoitsu_hand = build_chiitoitsu_hand(tiles)
-            if validate_tile_usage(chiitoitsu_hand, tiles):
-                return {
-                    "success": True,
-                    "hand": chiitoitsu_hand,
-                    "type": "chiitoitsu"
-                }
-            else:
-                # 4. それでも失敗した場合はランダムな手牌
-                random_hand = random.sample(tiles, min(13, len(tiles)))
-                return {
-                    "success": True,
-                    "hand": random_hand,
-                    "type": "random"
-                }
+def _win_points(dora):
+    """待ちごとの和了点を求める評価関数（期待値での順位付け用、dora はドラ）"""
+    from mahjong_engine import get_engine
+    engine = get_engine()
+    indicator = dora_indicator(dora) if dora else None
+    rendered = {}
+
+    def value(counts, wait_index):
+        # 判定エンジンの入口は牌文字列なので、手牌ごとに1回だけ変換する
+        key = bytes(counts)
+        if key not in rendered:
+            rendered[key] = render_hand(counts)
+        result = engine.check_win(rendered[key], TILE_NAMES[wait_index], indicator)
+        return result.get("points", 0) if result.get("isWinning") else 0
+    return value
+
+def make_rng(rng=None):
+    """
+    乱数生成器を返す（random.Random はそのまま、整数はそのシードで作る、Noneはプロセス既定）
+
+    グローバルな random の状態は使わないので、同じシードなら呼び出し元やワーカーによらず同じ結果になる。
+    """
+    if rng is None:
+        return _default_rng
+    if isinstance(rng, random.Random):
+        return rng
+    if isinstance(rng, bool) or not isinstance(rng, int):
+        raise ValueError(f"不正な乱数シード: {rng}")
+    return random.Random(rng)
+
+def _pick_candidate(candidates, rank, rng=None):
+    """最上位と同点の候補からランダムに1つ選ぶ（期待値では評価済みの候補だけから選ぶ）"""
+    def score(candidate):
+        if rank == RANK_EV:
+            return (candidate["ev"], candidate["width"])
+        if rank == RANK_VALUE:
+            return (candidate["value"], candidate["width"])
+        return (candidate["width"], len(candidate["waits"]))
+    if rank == RANK_EV:
+        candidates = [c for c in candidates if c.get("ev") is not None]
+    best = max(score(c) for c in candidates)
+    return make_rng(rng).choice([c for c in candidates if score(c) == best])
+
+def _apply_evaluations(candidates, evaluations):
+    """期待値評価の結果を候補に書き込む（評価できなかった候補は ev が None のまま）"""
+    for candidate, evaluation in zip(candidates, evaluations):
+        candidate.update(evaluation or {"ev": None})
+    return sum(1 for evaluation in evaluations if evaluation is not None)
+
+def _best_shanten_hand(pool):
+    """聴牌形が無い場合、向聴数が最小になるように1枚ずつ外して13枚にする"""
+    state = ShantenState(pool)
+    while sum(state.counts) > 13:
+        best = None
+        for index in range(34):
+            if state.counts[index] == 0:
+                continue
+            state.remove(index)
+            if best is None or state.shanten < best[0]:
+                best = (state.shanten, index)
+            state.add(index)
+        state.remove(best[1])
+    return array('B', state.counts)
+
+def _search_candidates(pool, seen, dora, forms, rank, budget_ms, top_k=SEARCH_TOP_K):
+    """聴牌形の候補を探索する（期待値での順位付けは候補の評価を別に行う）"""
+    if rank not in (RANK_WIDTH, RANK_VALUE, RANK_EV):
+        raise ValueError(f"不正な順位付け: {rank}")
+    value_fn = _win_points(dora) if rank == RANK_VALUE else None
+    with stage("search"):
+        result = search_tenpai_hands(pool, seen, forms, budget_ms, top_k, value_fn)
+    stats = {
+        "searched": result["searched"],
+        "tenpai": result["tenpai"],
+        "complete": result["complete"],
+        "elapsedMs": result["elapsedMs"]
+    }
+    return result["candidates"], stats
+
+def plan_cpu_tenpai(tiles, dora, force_chiitoitsu=False, rank=RANK_WIDTH, budget_ms=None, difficulty=None):
+    """
+    CPU聴牌形の探索までを行い、候補の評価前の状態を返す（プロセスプールに渡せるモジュール関数）
+
+    difficulty を指定すると順位付け・候補数・時間予算は難易度の設定に従う（budget_ms は探索の予算を上書き）。
+    """
+    if difficulty is not None:
+        settings = get_difficulty(difficulty)
+        rank = settings.rank
+        top_k = settings.top_k
+        eval_budget_ms = settings.eval_budget_ms
+        budget_ms = settings.search_budget_ms if budget_ms is None else budget_ms
+    else:
+        top_k = SEARCH_TOP_K
+        eval_budget_ms = budget_ms
+    # 牌文字列はここで1回だけ枚数ベクトルに変換し、出力時に戻す
+    pool, names, seen = parse_tiles(tiles, dora)
+    forms = (FORM_CHIITOITSU,) if force_chiitoitsu else ALL_FORMS
+    candidates, stats = _search_candidates(pool, seen, dora, forms, rank, budget_ms, top_k)
+    return {
+        "pool": bytes(pool),
+        "names": names,
+        "seen": bytes(seen) if seen else None,
+        "dora": dora,
+        "forceChiitoitsu": force_chiitoitsu,
+        "rank": rank,
+        "difficulty": difficulty,
+        "evalBudgetMs": eval_budget_ms,
+        "candidates": candidates,
+        "search": stats
+    }
+
+def finish_cpu_tenpai(plan, evaluations=None, rng=None):
+    """plan_cpu_tenpai の候補（と期待値評価の結果）から13枚を選んで結果にする"""
+    candidates = plan["candidates"]
+    stats = plan["search"]
+    if candidates and evaluations is not None:
+        stats["evaluated"] = _apply_evaluations(candidates, evaluations)
+
+    if not candidates:
+        # 聴牌形が作れない牌姿は向聴数が最小の13枚を返す
+        counts = _best_shanten_hand(array('B', plan["pool"]))
+        return {
+            "success": True,
+            "hand": render_hand(counts, plan["names"]),
+            "type": "best_shanten",
+            "waits": [],
+            "search": stats
+        }
+
+    candidate = _pick_candidate(candidates, plan["rank"], rng)
+    hand_type = _hand_type(candidate["counts"])
+    result = {
+        "success": True,
+        "hand": render_hand(candidate["counts"], plan["names"]),
+        "type": "chiitoitsu_forced" if plan["forceChiitoitsu"] else hand_type,
+        "waits": [TILE_NAMES[index] for index in candidate["waits"]],
+        "width": candidate["width"],
+        "value": candidate["value"],
+        "search": stats
+    }
+    if plan["rank"] == RANK_EV:
+        result.update({
+            "ev": candidate["ev"],
+            "winProbability": candidate["winProbability"],
+            "expectedPoints": candidate["expectedPoints"]
+        })
+    if plan["difficulty"] is not None:
+        result["difficulty"] = plan["difficulty"]
+    return result
+
+def generate_cpu_tenpai(tiles, dora, force_chiitoitsu=False, rank=RANK_WIDTH, budget_ms=None, difficulty=None,
+                        rng=None):
+    """
+    CPU聴牌形を生成（待ちの広さ、または期待値で最も良い13枚、dora はドラ）
+
+    rng（random.Random または整数のシード）を指定すると同点の候補からの選択が再現する
+    （探索が時間予算で打ち切られない場合）。
+    """
+    rng = make_rng(rng)
+    plan = plan_cpu_tenpai(tiles, dora, force_chiitoitsu, rank, budget_ms, difficulty)
+    evaluations = None
+    if plan["rank"] == RANK_EV and plan["candidates"]:
+        evaluations = evaluate_candidates(
+            plan["candidates"], plan["pool"], plan["seen"], dora, plan["evalBudgetMs"])
+    return finish_cpu_tenpai(plan, evaluations, rng)
+
+def handle_request(input_data):
+    """
+    1件のリクエストを処理（コマンドライン・常駐ワーカー共通）
+    """
+    tiles = input_data.get('tiles')
+    dora = input_data.get('dora')
+    force_chiitoitsu = input_data.get('forceChiitoitsu', False)
+    rank = input_data.get('rank') or RANK_WIDTH
+    budget_ms = input_data.get('timeBudgetMs')
+    # 順位付けを指定しない場合は難易度（既定は normal）に従う
+    difficulty = input_data.get('difficulty') or (None if input_data.get('rank') else DEFAULT_DIFFICULTY)
+    seed = input_data.get('seed')
+    
+    if not tiles or not dora:
+        raise ValueError("Missing required parameters (tiles, dora)")
     
-    except Exception as e:
-        # エラー時は七対子を作成
-        try:
-            chiitoitsu_hand = build_chiitoitsu_hand(tiles)
-            return {
-                "success": True,
-                "hand": chiitoitsu_hand,
-                "type": "chiitoitsu_fallback"
-            }
-        except:
-            # 最終的にランダムな手牌
-            random_hand = random.sample(tiles, min(13, len(tiles)))
-            return {
-                "success": True,
-                "hand": random_hand,
-                "type": "random_fallback"
-            }
+    return generate_cpu_tenpai(tiles, dora, force_chiitoitsu, rank, budget_ms, difficulty, seed)
 
 def main():
+    # 常駐ワーカーモード（標準入力から改行区切りJSONを読み続ける）
+    if is_worker_mode():
+        serve(handle_request)
+        return
+    
     if len(sys.argv) < 2:
         print(json.dumps({"error": "No input data provided"}), ensure_ascii=False)
         sys.exit(1)
     
     input_data = json.loads(sys.argv[1])
     
-    tiles = input_data.get('tiles')
-    dora = input_data.get('dora')
-    force_chiitoitsu = input_data.get('forceChiitoitsu', False)
-    
-    if not tiles or not dora:
-        print(json.dumps({"error": "Missing required parameters (tiles, dora)"}), ensure_ascii=False)
+    try:
+        result = handle_request(input_data)
+    except ValueError as e:
+        print(json.dumps({"error": str(e)}, ensure_ascii=False))
         sys.exit(1)
     
-    result = generate_cpu_tenpai(tiles, dora, force_chiitoitsu)
     print(json.dumps(result, ensure_ascii=False))
 
 if __name__ == "__main__":
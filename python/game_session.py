@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+1局分の状態をサーバーに持つセッション
+
+局の開始時にセッションを作り（ドラ表示牌を固定）、各席の13枚を1回だけ登録すると、
+その時点で待ち牌ごとの和了判定（飜・符・点数・役）をまとめて求めておく。
+以降は捨て牌だけを送れば、他の席の待ちを辞書で引くだけでロン和了を判定できる。
+
+セッションは SessionStore に保存する。既定の MemorySessionStore はプロセス内の辞書で、
+件数の上限（古いものから破棄）と最終アクセスからの有効期限を持つ。
+別の保存先を使う場合は SessionStore を継承して get・put・delete を実装したクラスに差し替える。
+"""
+
+import secrets
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+
+from mahjong_engine import RULE_RIICHI
+from tile_codec import TILE_NAMES, tile_to_index
+from wait_table import build_wait_table
+
+PLAYER = 'player'
+CPU = 'cpu'
+SEATS = (PLAYER, CPU)
+
+# 1セッションで受け付ける捨て牌の上限（山の枚数）
+MAX_DISCARDS = 136
+
+
+class SessionNotFoundError(LookupError):
+    """
+    セッションが存在しない、または有効期限切れ
+    """
+
+
+def score_waits(tiles, dora, rule=RULE_RIICHI):
+    """
+    13枚の待ち牌ごとの和了判定結果 {34種インデックス: 結果}（プロセスプールに渡せるモジュール関数）
+
+    形の上での待ちのうち、役があり和了できるものだけを含む。
+    """
+    return {index: result for index, result in enumerate(build_wait_table(tiles, dora, rule)) if result}
+
+
+class GameSession:
+    """
+    1局分の状態（ドラ表示牌・席ごとの手牌と和了できる待ち・捨て牌）
+    """
+
+    def __init__(self, session_id, dora, rule=RULE_RIICHI):
+        tile_to_index(dora)
+        self.id = session_id
+        self.dora = dora
+        self.rule = rule
+        self.hands = {}
+        self.waits = {}
+        self.discards = []
+        self.created_at = time.time()
+
+    def register_hand(self, seat, tiles, waits):
+        """
+        席の13枚と、score_waits で求めた待ちを登録する（同じ席は置き換える）
+        """
+        if seat not in SEATS:
+            raise ValueError(f"不正な席: {seat}")
+        self.hands[seat] = list(tiles)
+        self.waits[seat] = waits
+        return self.hand_summary(seat)
+
+    def hand_summary(self, seat):
+        waits = self.waits[seat]
+        return {
+            "seat": seat,
+            "isTenpai": len(waits) > 0,
+            "waitingTiles": [TILE_NAMES[index] for index in sorted(waits)]
+        }
+
+    def discard(self, seat, tile):
+        """
+        seat の捨て牌で、登録済みの他の席がロン和了できるかを返す
+        """
+        if seat not in SEATS:
+            raise ValueError(f"不正な席: {seat}")
+        index = tile_to_index(tile)
+        if len(self.discards) >= MAX_DISCARDS:
+            raise ValueError("捨て牌の数が上限を超えています")
+        self.discards.append((seat, tile))
+
+        for other in SEATS:
+            if other == seat or other not in self.waits:
+                continue
+            result = self.waits[other].get(index)
+            if result is not None:
+                return dict(result, winner=other, turn=len(self.discards))
+        return {"isWinning": False, "winner": None, "turn": len(self.discards)}
+
+    def to_dict(self):
+        return {
+            "sessionId": self.id,
+            "dora": self.dora,
+            "rules": self.rule.to_dict(),
+            "hands": {seat: self.hand_summary(seat) for seat in self.waits},
+            "discards": [{"seat": seat, "tile": tile} for seat, tile in self.discards]
+        }
+
+
+class SessionStore(ABC):
+    """
+    セッションの保存先（差し替え用のインターフェース）
+    """
+
+    @abstractmethod
+    def get(self, session_id):
+        """
+        セッションを返す（無い・期限切れなら SessionNotFoundError）
+        """
+
+    @abstractmethod
+    def put(self, session):
+        """
+        セッションを保存する（同じIDは置き換える）
+        """
+
+    @abstractmethod
+    def delete(self, session_id):
+        """
+        セッションを削除する（無ければ SessionNotFoundError）
+        """
+
+    def stats(self):
+        return {}
+
+
+class MemorySessionStore(SessionStore):
+    """
+    プロセス内のセッション保存先（件数の上限と、最終アクセスからの有効期限付き）
+
+    最終アクセス順に並べておき、期限切れは古い側から順に取り除く。
+    """
+
+    def __init__(self, max_sessions=10000, idle_ttl=1800.0):
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+        self.expirations = 0
+        self.evictions = 0
+
+    def _purge_expired(self, now):
+        while self._sessions:
+            session_id, (_, accessed_at) = next(iter(self._sessions.items()))
+            if accessed_at + self.idle_ttl > now:
+                break
+            del self._sessions[session_id]
+            self.expirations += 1
+
+    def get(self, session_id):
+        now = time.monotonic()
+        with self._lock:
+            self._purge_expired(now)
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                raise SessionNotFoundError(f"セッションが見つかりません: {session_id}")
+            self._sessions[session_id] = (entry[0], now)
+            self._sessions.move_to_end(session_id)
+            return entry[0]
+
+    def put(self, session):
+        now = time.monotonic()
+        with self._lock:
+            self._purge_expired(now)
+            self._sessions[session.id] = (session, now)
+            self._sessions.move_to_end(session.id)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, session_id):
+        with self._lock:
+            if self._sessions.pop(session_id, None) is None:
+                raise SessionNotFoundError(f"セッションが見つかりません: {session_id}")
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": len(self._sessions),
+                "maxSessions": self.max_sessions,
+                "idleTtl": self.idle_ttl,
+                "expirations": self.expirations,
+                "evictions": self.evictions
+            }
+
+
+def create_session(store, dora, rule=RULE_RIICHI):
+    """
+    新しいセッションを作って保存する
+    """
+    session = GameSession(secrets.token_urlsafe(16), dora, rule)
+    store.put(session)
+    return session
@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+二人麻雀（GAME_RULES.md）の対局をブラウザ無しで実行するシミュレーター
+
+1局の流れはフロントエンド（app/hooks/useMahjongDeal.ts）と同じ:
+  山をシャッフル → 34枚ずつ配布・69枚目がドラ → 双方が13枚を選択（残り21枚が捨て牌候補）
+  → プレイヤー・CPUの順に捨て牌候補から1枚ずつ捨て、相手の捨て牌で和了できれば和了
+  → 捨て牌候補が尽きたら流局
+和了者は飜数に応じた得点（addScore と同じ換算）を得て、先に目標点に達した側の勝ち。
+手牌の選択は双方とも generate_cpu_tenpai（順位付けは側ごとに指定、既定では探索を打ち切らない）、
+捨て牌の順番はシャッフルした順（CPUはフロントエンドと同じ、プレイヤーは無作為に捨てる想定）。
+
+使い方:
+  python game_simulator.py --games 1000 --seed 1 --workers 4 --output results.jsonl
+結果は1対局1行のJSONで、終わった順ではなく対局番号順に書き出す。
+"""
+
+import argparse
+import json
+import math
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+from cpu_strategy import dora_indicator, han_to_points
+from cpu_tenpai_generator import generate_cpu_tenpai
+from hand_search import RANK_WIDTH
+from hand_shape import find_waits
+from mahjong_engine import get_engine
+from tile_codec import TILE_NAMES, tile_to_index, tiles_to_counts
+from worker_pool import _warm_up
+
+# 山（フロントエンドの generateTiles と同じ34種×4枚）
+WALL = tuple(tile for tile in TILE_NAMES for _ in range(4))
+DEAL_SIZE = 34
+HAND_SIZE = 13
+TARGET_POINTS = 10
+MAX_ROUNDS = 100
+
+PLAYER = 'player'
+CPU = 'cpu'
+
+
+def deal(rng):
+    """
+    山をシャッフルして (プレイヤーの34枚, CPUの34枚, ドラ) を返す
+    """
+    wall = list(WALL)
+    rng.shuffle(wall)
+    return wall[:DEAL_SIZE], wall[DEAL_SIZE:DEAL_SIZE * 2], wall[DEAL_SIZE * 2]
+
+
+def _select_hand(tiles, dora, rank, budget_ms, rng):
+    """
+    34枚から手牌13枚を選び、(手牌, 捨て牌候補21枚, 生成結果の種類) を返す
+    """
+    result = generate_cpu_tenpai(tiles, dora, False, rank, budget_ms, rng=rng)
+    hand = result["hand"]
+    discards = list(tiles)
+    for tile in hand:
+        discards.remove(tile)
+    return hand, discards, result["type"]
+
+
+def _try_win(engine, hand, waits, tile, indicator):
+    """
+    捨て牌で和了できるか（形の上で待ちでない牌は点数計算せずに不和了）
+    """
+    if tile_to_index(tile) not in waits:
+        return None
+    result = engine.check_win(hand, tile, indicator)
+    return result if result.get("isWinning") else None
+
+
+def play_round(rng, options, hand_rng=None):
+    """
+    1局を実行して結果を返す（rng は配牌・捨て牌の順番、hand_rng は手牌選択の同点候補の選択に使う）
+    """
+    hand_rng = hand_rng or rng
+    engine = get_engine()
+    player_tiles, cpu_tiles, dora = deal(rng)
+    indicator = dora_indicator(dora)
+
+    player_hand, player_discards, player_type = _select_hand(
+        player_tiles, dora, options["player_rank"], options["budget_ms"], hand_rng)
+    cpu_hand, cpu_discards, cpu_type = _select_hand(
+        cpu_tiles, dora, options["cpu_rank"], options["budget_ms"], hand_rng)
+    rng.shuffle(player_discards)
+    rng.shuffle(cpu_discards)
+
+    player_waits = set(find_waits(tiles_to_counts(player_hand)))
+    cpu_waits = set(find_waits(tiles_to_counts(cpu_hand)))
+
+    record = {
+        "dora": dora,
+        "playerHand": player_hand,
+        "cpuHand": cpu_hand,
+        "playerType": player_type,
+        "cpuType": cpu_type,
+        "playerWaits": [TILE_NAMES[i] for i in sorted(player_waits)],
+        "cpuWaits": [TILE_NAMES[i] for i in sorted(cpu_waits)],
+        "winner": None,
+        "turn": None
+    }
+
+    for turn, (player_tile, cpu_tile) in enumerate(zip(player_discards, cpu_discards), 1):
+        # プレイヤーの捨て牌でCPUのロン判定、続いてCPUの捨て牌でプレイヤーのロン判定
+        for winner, hand, waits, tile in (
+            (CPU, cpu_hand, cpu_waits, player_tile),
+            (PLAYER, player_hand, player_waits, cpu_tile),
+        ):
+            result = _try_win(engine, hand, waits, tile, indicator)
+            if result:
+                record.update({
+                    "winner": winner,
+                    "turn": turn,
+                    "winningTile": tile,
+                    "han": result["han"],
+                    "fu": result["fu"],
+                    "yaku": result["yaku"],
+                    "points": han_to_points(result["han"])
+                })
+                return record
+    return record
+
+
+def play_game(seed, options):
+    """
+    どちらかが目標点に達するまで局を重ねた1対局の結果を返す
+    """
+    started = time.perf_counter()
+    rng = random.Random(seed)
+    # 手牌生成の同点候補からの選択も対局ごとに再現できるよう、グローバルな random を使わず別系列で持つ
+    # （同じシードだと配牌・捨て牌と同じ乱数列になるので、シードから別の値を作る）
+    hand_rng = random.Random(f"{seed}:hand")
+
+    score = {PLAYER: 0, CPU: 0}
+    rounds = []
+    while max(score.values()) < options["target_points"] and len(rounds) < options["max_rounds"]:
+        record = play_round(rng, options, hand_rng)
+        if record["winner"]:
+            score[record["winner"]] += record["points"]
+        rounds.append(record)
+
+    winner = None
+    if max(score.values()) >= options["target_points"]:
+        winner = PLAYER if score[PLAYER] >= options["target_points"] else CPU
+    return {
+        "seed": seed,
+        "winner": winner,
+        "score": score,
+        "roundCount": len(rounds),
+        "draws": sum(1 for r in rounds if r["winner"] is None),
+        "rounds": rounds if options["include_rounds"] else None,
+        "elapsedMs": round((time.perf_counter() - started) * 1000, 3)
+    }
+
+
+def run_games(games, seed=0, workers=1, options=None):
+    """
+    games 対局を実行し、対局番号順に結果を返すイテレーター
+
+    対局 i の乱数シードは seed + i。workers が2以上ならプロセスプールで並列に実行する。
+    """
+    options = dict(default_options(), **(options or {}))
+    seeds = range(seed, seed + games)
+    if workers <= 1:
+        for game_seed in seeds:
+            yield play_game(game_seed, options)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_warm_up) as executor:
+        chunksize = max(1, min(32, games // (workers * 4)))
+        yield from executor.map(play_game, seeds, repeat(options), chunksize=chunksize)
+
+
+def default_options():
+    return {
+        "target_points": TARGET_POINTS,
+        "max_rounds": MAX_ROUNDS,
+        "player_rank": RANK_WIDTH,
+        "cpu_rank": RANK_WIDTH,
+        # 時間で打ち切ると結果が実行環境に左右されるため、既定では探索を最後まで行う
+        "budget_ms": math.inf,
+        "include_rounds": True
+    }
+
+
+def summarize(results):
+    """
+    対局結果の集計（勝率・平均局数など）
+    """
+    games = len(results)
+    if not games:
+        return {"games": 0}
+    wins = {PLAYER: 0, CPU: 0, None: 0}
+    for result in results:
+        wins[result["winner"]] += 1
+    rounds = sum(r["roundCount"] for r in results)
+    return {
+        "games": games,
+        "playerWins": wins[PLAYER],
+        "cpuWins": wins[CPU],
+        "unfinished": wins[None],
+        "playerWinRate": round(wins[PLAYER] / games, 4),
+        "averageRounds": round(rounds / games, 3),
+        "drawRate": round(sum(r["draws"] for r in results) / rounds, 4) if rounds else 0.0
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="二人麻雀の対局シミュレーター")
+    parser.add_argument("--games", type=int, default=100, help="対局数")
+    parser.add_argument("--seed", type=int, default=0, help="最初の対局の乱数シード（対局 i は seed + i）")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="並列に実行するプロセス数")
+    parser.add_argument("--output", default="-", help="結果のJSONLファイル（- は標準出力）")
+    parser.add_argument("--target-points", type=int, default=TARGET_POINTS, help="勝利に必要な点数")
+    parser.add_argument("--max-rounds", type=int, default=MAX_ROUNDS, help="1対局の最大局数")
+    parser.add_argument("--player-rank", default=RANK_WIDTH, help="プレイヤーの手牌選択の順位付け（width / value / ev）")
+    parser.add_argument("--cpu-rank", default=RANK_WIDTH, help="CPUの手牌選択の順位付け（width / value / ev）")
+    parser.add_argument("--budget-ms", type=float, default=math.inf,
+                        help="手牌探索の時間予算（ミリ秒、指定すると速くなるが結果は再現しなくなる）")
+    parser.add_argument("--summary-only", action="store_true", help="局ごとの詳細を出力しない")
+    args = parser.parse_args()
+
+    options = {
+        "target_points": args.target_points,
+        "max_rounds": args.max_rounds,
+        "player_rank": args.player_rank,
+        "cpu_rank": args.cpu_rank,
+        "budget_ms": args.budget_ms,
+        "include_rounds": not args.summary_only
+    }
+
+    started = time.perf_counter()
+    output = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    results = []
+    try:
+        for number, result in enumerate(run_games(args.games, args.seed, args.workers, options)):
+            output.write(json.dumps(dict(game=number, **result), ensure_ascii=False) + "\n")
+            output.flush()
+            # 集計用には詳細を除いて保持する
+            results.append({k: result[k] for k in ("winner", "roundCount", "draws")})
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+    summary = summarize(results)
+    summary["elapsedSec"] = round(time.perf_counter() - started, 3)
+    print(json.dumps(summary, ensure_ascii=False), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,23 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+色ごとの分解テーブル（data/suit_table.bin）を生成するスクリプト
+
+使い方: python generate_suit_table.py [出力パス]
+"""
+
+import sys
+
+from suit_table import DEFAULT_TABLE_PATH, load_table, save_table
+
+
+def main():
+    path = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_TABLE_PATH
+    checksum = save_table(path)
+    table = load_table(path)
+    print(f"✅ {path} を生成しました（{len(table)}エントリ）")
+    print(f"SHA-256: {checksum}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+手持ちの牌（34種の枚数ベクトル）から聴牌する13枚を探索する
+
+面子を添字の昇順に積み上げる深さ優先探索で
+「4面子+単騎」「3面子+雀頭+塔子」「3面子+対子2組」の形を列挙し、
+七対子・国士無双の形も別に列挙する。
+同じ13枚や同じ面子構成に至る経路（111222333の刻子3組と順子3組など）は
+枚数ベクトルで重複を除き、待ちは形判定（hand_shape.find_waits）で確定させる。
+候補は待ちの広さ（自分の手持ちと見えている牌以外に残る待ち牌の枚数）で順位付けし、
+評価関数を渡した場合は上位候補を期待値で並べ替える。
+探索は時間予算で打ち切り、打ち切ったかどうかを結果に含める。
+"""
+
+import heapq
+import os
+import time
+from itertools import combinations
+
+from hand_shape import TERMINAL_HONOR_INDICES, find_waits
+
+# 探索の時間予算（ミリ秒、環境変数で変更可能）
+SEARCH_BUDGET_MS = float(os.environ.get("MAHJONG_SEARCH_BUDGET_MS", 200))
+# 結果として残す候補数
+SEARCH_TOP_K = 8
+
+# 探索する形
+FORM_STANDARD = 'standard'
+FORM_CHIITOITSU = 'chiitoitsu'
+FORM_KOKUSHI = 'kokushi'
+ALL_FORMS = (FORM_STANDARD, FORM_CHIITOITSU, FORM_KOKUSHI)
+
+# 順位付けの基準
+RANK_WIDTH = 'width'  # 待ちの残り枚数
+RANK_VALUE = 'value'  # 残り枚数×和了点の合計（期待値）
+RANK_EV = 'ev'        # 和了率×和了時の得点（探索は待ちの広さで行い、上位候補を cpu_strategy で評価）
+
+# 面子（刻子34種+順子21種）と塔子（両面・辺張21種+嵌張21種）
+_MELDS = tuple((i, i, i) for i in range(34)) + tuple(
+    (s + n, s + n + 1, s + n + 2) for s in (0, 9, 18) for n in range(7)
+)
+_TAATSU = tuple((s + n, s + n + 1) for s in (0, 9, 18) for n in range(8)) + tuple(
+    (s + n, s + n + 2) for s in (0, 9, 18) for n in range(7)
+)
+
+# 締め切りを確認する間隔（評価した手牌の数）
+_DEADLINE_CHECK_INTERVAL = 64
+
+
+class _Search:
+    """
+    1回の探索の状態（使用中の枚数・評価済みの手牌・上位候補）
+    """
+
+    def __init__(self, pool, seen, deadline, top_k):
+        self.pool = pool
+        self.seen = seen
+        self.deadline = deadline
+        self.top_k = top_k
+        # 手牌は34バイトの可変配列で持ち、そのままbytesにして重複判定のキーにする
+        self.hand = bytearray(34)
+        self.evaluated = set()
+        self.expanded = set()
+        self.heap = []
+        self.searched = 0
+        self.tenpai = 0
+        self.expired = False
+
+    def take(self, tiles):
+        """
+        手持ちに残っていれば tiles を手牌に加える（足りなければ何もせずFalse）
+        """
+        for n, i in enumerate(tiles):
+            if self.hand[i] >= self.pool[i]:
+                self.put_back(tiles[:n])
+                return False
+            self.hand[i] += 1
+        return True
+
+    def put_back(self, tiles):
+        for i in tiles:
+            self.hand[i] -= 1
+
+    def evaluate(self):
+        """
+        現在の13枚を評価し、聴牌なら上位候補に加える
+        """
+        key = bytes(self.hand)
+        if key in self.evaluated:
+            return
+        self.evaluated.add(key)
+        self.searched += 1
+        if self.searched % _DEADLINE_CHECK_INTERVAL == 0 and time.perf_counter() >= self.deadline:
+            self.expired = True
+
+        waits = find_waits(self.hand)
+        if not waits:
+            return
+        self.tenpai += 1
+        width = sum(max(0, 4 - self.pool[w] - self.seen[w]) for w in waits)
+        entry = (width, len(waits), key)
+        if len(self.heap) < self.top_k:
+            heapq.heappush(self.heap, entry)
+        elif entry > self.heap[0]:
+            heapq.heapreplace(self.heap, entry)
+
+    def standard(self, start=0, melds=0):
+        """
+        面子を添字の昇順に積み上げ、3面子・4面子の時点で残りの形を埋める
+        """
+        if self.expired:
+            return
+        # 別の面子構成で同じ枚数に至った状態は展開済み
+        state = (bytes(self.hand), melds)
+        if state in self.expanded:
+            return
+        self.expanded.add(state)
+
+        if melds == 4:
+            # 4面子+単騎
+            for i in range(34):
+                if self.take((i,)):
+                    self.evaluate()
+                    self.put_back((i,))
+            return
+
+        if melds == 3:
+            pairs = [i for i in range(34) if self.pool[i] - self.hand[i] >= 2]
+            for p in pairs:
+                self.take((p, p))
+                # 3面子+雀頭+塔子
+                for taatsu in _TAATSU:
+                    if self.take(taatsu):
+                        self.evaluate()
+                        self.put_back(taatsu)
+                # 3面子+対子2組（双碰）
+                for q in pairs:
+                    if q > p and self.take((q, q)):
+                        self.evaluate()
+                        self.put_back((q, q))
+                self.put_back((p, p))
+                if self.expired:
+                    return
+
+        for m in range(start, len(_MELDS)):
+            meld = _MELDS[m]
+            if self.take(meld):
+                self.standard(m, melds + 1)
+                self.put_back(meld)
+            if self.expired:
+                return
+
+    def chiitoitsu(self):
+        """
+        異なる6種の対子+単騎1枚
+        """
+        pairs = [i for i in range(34) if self.pool[i] >= 2]
+        for chosen in combinations(pairs, 6):
+            for i in chosen:
+                self.hand[i] = 2
+            for single in range(34):
+                if self.hand[single] == 0 and self.pool[single] >= 1:
+                    self.hand[single] = 1
+                    self.evaluate()
+                    self.hand[single] = 0
+            for i in chosen:
+                self.hand[i] = 0
+            if self.expired:
+                return
+
+    def kokushi(self):
+        """
+        么九牌13種（13面待ち）、または12種+そのうち1種の対子
+        """
+        available = [i for i in TERMINAL_HONOR_INDICES if self.pool[i] >= 1]
+        if len(available) < 12:
+            return
+        for kinds in combinations(available, 12):
+            for i in kinds:
+                self.hand[i] = 1
+            for pair in kinds:
+                if self.pool[pair] >= 2:
+                    self.hand[pair] = 2
+                    self.evaluate()
+                    self.hand[pair] = 1
+            for i in kinds:
+                self.hand[i] = 0
+        if len(available) == 13:
+            for i in available:
+                self.hand[i] = 1
+            self.evaluate()
+            for i in available:
+                self.hand[i] = 0
+
+
+def search_tenpai_hands(pool, seen=None, forms=ALL_FORMS, budget_ms=None,
+                        top_k=SEARCH_TOP_K, value_fn=None):
+    """
+    手持ちの枚数ベクトル pool から聴牌する13枚を探索し、良い順に返す
+
+    seen は手持ち以外で見えている牌（ドラ表示牌など）の枚数ベクトル。
+    value_fn(counts, wait_index) を渡すと待ちごとの和了点を求め、
+    残り枚数×和了点の合計（期待値）で上位候補を並べ替える。
+    戻り値の candidates は {counts, waits, width, value} のリスト（counts は34バイトのbytes）。
+    """
+    started = time.perf_counter()
+    budget_ms = SEARCH_BUDGET_MS if budget_ms is None else budget_ms
+    search = _Search(bytes(pool), bytes(seen or bytes(34)), started + budget_ms / 1000, top_k)
+
+    # 候補の少ない形から探索し、時間予算を通常形に残す
+    if FORM_KOKUSHI in forms:
+        search.kokushi()
+    if FORM_CHIITOITSU in forms and not search.expired:
+        search.chiitoitsu()
+    if FORM_STANDARD in forms and not search.expired:
+        search.standard()
+
+    candidates = []
+    for width, _, key in sorted(search.heap, reverse=True):
+        candidates.append({
+            "counts": key,
+            "waits": find_waits(key),
+            "width": width,
+            "value": None
+        })
+
+    if value_fn is not None:
+        for candidate in candidates:
+            candidate["value"] = sum(
+                max(0, 4 - search.pool[w] - search.seen[w]) * value_fn(candidate["counts"], w)
+                for w in candidate["waits"]
+            )
+        candidates.sort(key=lambda candidate: (candidate["value"], candidate["width"]), reverse=True)
+
+    return {
+        "candidates": candidates,
+        "searched": search.searched,
+        "tenpai": search.tenpai,
+        "complete": not search.expired,
+        "elapsedMs": round((time.perf_counter() - started) * 1000, 3)
+    }
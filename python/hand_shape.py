@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+34種の枚数ベクトルによる手牌の形（面子・雀頭への分解）判定
+
+和了形・待ち牌の判定を点数計算ライブラリを使わずに行う。
+萬子・筒子・索子・字牌の各グループを事前計算テーブル（suit_table）で引き、
+その結果を組み合わせて手牌全体を判定する。
+"""
+
+from suit_table import (
+    COMPLETE, COMPLETE_WITH_PAIR, WAIT_MASK, WAIT_SHIFT, WAIT_WITH_PAIR_SHIFT, get_table
+)
+
+# 么九牌（国士無双の構成牌）
+TERMINAL_HONOR_INDICES = (0, 8, 9, 17, 18, 26, 27, 28, 29, 30, 31, 32, 33)
+
+# グループの枚数パターン→テーブルのエントリ（上限を超えたら作り直す）
+_ENTRY_CACHE_LIMIT = 1 << 18
+_entry_cache = {}
+
+
+def _split_groups(counts):
+    """
+    枚数ベクトルを萬子・筒子・索子・字牌の4グループに分割
+    """
+    return (
+        tuple(counts[0:9]),
+        tuple(counts[9:18]),
+        tuple(counts[18:27]),
+        tuple(counts[27:34]),
+    )
+
+
+def _group_entry(group_index, group):
+    """
+    グループの枚数パターンに対応するテーブルのエントリ
+
+    引いた結果はパターン（長さ9は数牌・7は字牌のタプル）ごとに覚えておき、
+    同じパターンではテーブルの二分探索を繰り返さない。
+    """
+    entry = _entry_cache.get(group)
+    if entry is None:
+        if len(_entry_cache) >= _ENTRY_CACHE_LIMIT:
+            _entry_cache.clear()
+        table = get_table()
+        entry = table.honors(group) if group_index == 3 else table.suit(group)
+        _entry_cache[group] = entry
+    return entry
+
+
+def _entry_waits(entry, with_pair):
+    """
+    エントリから待ち牌（グループ内のインデックス）を取り出す
+    """
+    shift = WAIT_WITH_PAIR_SHIFT if with_pair else WAIT_SHIFT
+    bits = (entry >> shift) & WAIT_MASK
+    return [i for i in range(9) if bits >> i & 1]
+
+
+def _standard_waits(counts):
+    """
+    4面子1雀頭形の待ち牌を求める（4グループのテーブル参照+組み合わせ）
+    """
+    entries = [_group_entry(g, group) for g, group in enumerate(_split_groups(counts))]
+
+    # complete[g] は 0: 面子のみで完成, 1: 雀頭込みで完成, None: 未完成
+    complete = []
+    for entry in entries:
+        if entry & COMPLETE:
+            complete.append(0)
+        elif entry & COMPLETE_WITH_PAIR:
+            complete.append(1)
+        else:
+            complete.append(None)
+
+    waits = set()
+    for g, entry in enumerate(entries):
+        # 和了牌を受け入れるグループ以外は全て完成している必要がある
+        others = [complete[o] for o in range(4) if o != g]
+        if any(state is None for state in others):
+            continue
+        pairs_in_others = sum(others)
+        if pairs_in_others == 1:
+            # 面子のみで完成させる待ち（両面・嵌張・辺張・双碰の片側など）
+            found = _entry_waits(entry, False)
+        elif pairs_in_others == 0:
+            # 雀頭を含めて完成させる待ち（単騎など）
+            found = _entry_waits(entry, True)
+        else:
+            continue
+        offset = g * 9
+        waits.update(offset + i for i in found)
+    return waits
+
+
+def _chiitoitsu_waits(counts):
+    """
+    七対子形の待ち牌を求める（同一牌4枚は2対子と数えない）
+    """
+    pairs = [i for i, c in enumerate(counts) if c == 2]
+    singles = [i for i, c in enumerate(counts) if c == 1]
+    if len(pairs) == 6 and len(singles) == 1:
+        return {singles[0]}
+    return set()
+
+
+def _kokushi_waits(counts):
+    """
+    国士無双形の待ち牌を求める
+    """
+    if sum(counts[i] for i in TERMINAL_HONOR_INDICES) != 13:
+        return set()
+    missing = [i for i in TERMINAL_HONOR_INDICES if counts[i] == 0]
+    if not missing:
+        # 13面待ち
+        return set(TERMINAL_HONOR_INDICES)
+    if len(missing) == 1:
+        return {missing[0]}
+    return set()
+
+
+def find_waits(counts):
+    """
+    13枚の枚数ベクトルから待ち牌のインデックスを昇順で返す
+
+    手牌で4枚使い切っている牌は待ちに含めない。
+    """
+    if sum(counts) != 13:
+        return []
+    waits = _standard_waits(counts)
+    waits |= _chiitoitsu_waits(counts)
+    waits |= _kokushi_waits(counts)
+    return sorted(i for i in waits if counts[i] < 4)
+
+
+def is_winning_shape(counts):
+    """
+    14枚の枚数ベクトルが和了形（4面子1雀頭・七対子・国士無双）か
+
+    点数計算の前の足切りに使うため、枚数の偶奇・対子の有無で判定できるものはテーブルを引かずに返す。
+    """
+    if sum(counts) != 14:
+        return False
+    peak = max(counts)
+    # どの和了形にも対子が必要
+    if peak > 4 or peak < 2:
+        return False
+    groups = _split_groups(counts)
+    # 4面子1雀頭なら、各グループの枚数は3の倍数で、1グループだけ3で割って2余る
+    remainders = [sum(group) % 3 for group in groups]
+    if remainders.count(2) == 1 and remainders.count(0) == 3:
+        pairs = 0
+        for g, group in enumerate(groups):
+            if not any(group):
+                continue
+            entry = _group_entry(g, group)
+            if entry & COMPLETE_WITH_PAIR:
+                pairs += 1
+            elif not entry & COMPLETE:
+                pairs = None
+                break
+        if pairs == 1:
+            return True
+    if counts.count(2) == 7:
+        return True
+    if all(counts[i] >= 1 for i in TERMINAL_HONOR_INDICES) and \
+            sum(counts[i] for i in TERMINAL_HONOR_INDICES) == 14:
+        return True
+    return False
@@ -0,0 +1,390 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+プロセス共通の和了・聴牌判定エンジン
+
+HandCalculator・TilesConverter・HandConfigをリクエストごとに作らず、
+プロセス内で使い回す。api_server.py と api/*.py のハンドラから共有される。
+ルールは rule_config.RuleConfig で指定し、面子への分解（ルールに依存しない）は
+点数計算ライブラリの分解キャッシュで手牌ごとに1回だけ行い、ルールごとの点数計算で使い回す。
+
+点数計算ライブラリ（役の定義をすべて読み込むため重い）は、実際に点数計算が必要になった時点で読み込む。
+形の上で和了形でない判定や、リーチ有りのルールでの聴牌判定（どの和了形にも立直が付くため
+形判定だけで待ちが確定する）はライブラリを読み込まずに済むので、サーバーレス関数の起動が軽くなる。
+"""
+
+import os
+import threading
+
+from hand_shape import find_waits, is_winning_shape
+from metrics import stage
+from result_cache import ResultCache, hand_key, tile_key
+from rule_config import DEFAULT_RULE, NO_RIICHI_RULE, TSUMO_RULE, RuleConfig
+from tile_codec import (
+    TILE_NAMES, encode_136, parse_added_tile, parse_hand, red_key, tile_to_index, tiles_to_counts
+)
+
+# よく使うルール
+RULE_RIICHI = DEFAULT_RULE       # ロン和了・常時リーチ（プレイヤーの通常ルール）
+RULE_TSUMO = TSUMO_RULE          # ツモ和了・常時リーチ
+RULE_NO_RIICHI = NO_RIICHI_RULE  # ロン和了・リーチなし
+
+# 結果キャッシュの設定（環境変数で変更可能、TTLは秒・0で無期限）
+CACHE_SIZE = int(os.environ.get("MAHJONG_CACHE_SIZE", 8192))
+CACHE_TTL = float(os.environ.get("MAHJONG_CACHE_TTL", 600))
+# スレッドごとの面子分解キャッシュの上限（超えたら作り直す）
+DIVIDER_CACHE_SIZE = int(os.environ.get("MAHJONG_DIVIDER_CACHE_SIZE", 4096))
+
+# 和了形でない場合のエラー（点数計算ライブラリの HandCalculator.ERR_HAND_NOT_WINNING と同じ値）
+ERR_HAND_NOT_WINNING = "hand_not_winning"
+
+
+def _parse_batch_item(item, require_last_tile):
+    """
+    バッチの1件分の入力チェックと手牌の変換（(エラー, 手牌) のどちらかがNone）
+    """
+    if not isinstance(item, dict):
+        return "入力形式が不正です", None
+    tiles = item.get('tiles')
+    if not isinstance(tiles, list) or len(tiles) != 13:
+        return "手牌は13枚である必要があります", None
+    if require_last_tile and not item.get('lastTile'):
+        return "和了牌が指定されていません", None
+    if not item.get('dora'):
+        return "ドラ表示牌が指定されていません", None
+    try:
+        # 単発のエンドポイントと同じく、手牌・和了牌・ドラ表示牌をすべて検証する
+        hand = parse_hand(tiles)
+        if require_last_tile:
+            parse_added_tile(hand, item['lastTile'])
+        tile_to_index(item['dora'])
+        return None, hand
+    except ValueError as e:
+        return str(e), None
+
+
+class MahjongEngine:
+    """
+    判定用オブジェクトを保持する長寿命のエンジン
+
+    HandCalculatorは計算中に状態を持つため、スレッドごとに1つ用意する。
+    136枚形式への変換は tile_codec で直接行う（TilesConverterの文字列経由にしない）。
+    HandConfigは読み取り専用としてルール（RuleConfig）ごとに1つずつ作って共有する。
+    判定結果は正規化した手牌とルールをキーにキャッシュする。
+    """
+
+    def __init__(self, cache_size=CACHE_SIZE, cache_ttl=CACHE_TTL):
+        self.configs = {}
+        self._local = threading.local()
+        self.cache = ResultCache(maxsize=cache_size, ttl=cache_ttl or None)
+
+    def hand_config(self, rule):
+        """
+        ルールに対応する HandConfig（ルールごとに1回だけ作る）
+        """
+        config = self.configs.get(rule)
+        if config is None:
+            if not isinstance(rule, RuleConfig):
+                raise ValueError(f"不正なルール設定: {rule!r}")
+            config = self.configs.setdefault(rule, rule.hand_config())
+        return config
+
+    def _calculator(self):
+        calculator = getattr(self._local, 'calculator', None)
+        if calculator is None:
+            from mahjong.hand_calculating.hand import HandCalculator
+            calculator = HandCalculator()
+            self._local.calculator = calculator
+        return calculator
+
+    def estimate(self, tiles, last_tile, dora, rule=RULE_RIICHI):
+        """
+        手牌13枚+和了牌の点数計算結果（HandResponse）を返す
+        """
+        with stage("conversion"):
+            tiles_136, win_tile_index = encode_136(tiles, last_tile)
+            dora_indicators = encode_136([dora]) if dora else []
+
+        config = self.hand_config(rule)
+        calculator = self._calculator()
+        divider = calculator.divider
+        if len(divider.divider_cache) >= DIVIDER_CACHE_SIZE:
+            divider.clear_cache()
+
+        with stage("scoring"):
+            # 面子への分解はルールに依存しないため、同じ14枚なら分解キャッシュを使い回す
+            return calculator.estimate_hand_value(
+                tiles=tiles_136,
+                win_tile=win_tile_index,
+                melds=[],
+                dora_indicators=dora_indicators,
+                config=config,
+                use_hand_divider_cache=True
+            )
+
+    def win_cache_key(self, tiles, last_tile, dora, rule=RULE_RIICHI):
+        """
+        和了判定のキャッシュキー（不正な牌を含む場合はNone）
+        """
+        try:
+            # 赤ドラ有りのルールでは、同じ並びでも赤ドラの有無で結果が変わる
+            red = red_key(list(tiles) + [last_tile]) if rule.aka_dora else ()
+            return ('win', hand_key(tiles), tile_key(last_tile), tile_key(dora), rule, red)
+        except ValueError:
+            return None
+
+    def tenpai_cache_key(self, tiles, dora=None, rule=RULE_RIICHI):
+        """
+        聴牌判定のキャッシュキー（不正な牌を含む場合はNone）
+        """
+        try:
+            red = red_key(tiles) if rule.aka_dora else ()
+            return ('tenpai', hand_key(tiles), tile_key(dora), rule, red)
+        except ValueError:
+            return None
+
+    def check_win(self, tiles, last_tile, dora, rule=RULE_RIICHI):
+        """
+        和了判定を実行
+        """
+        key = self.win_cache_key(tiles, last_tile, dora, rule)
+        if key is None:
+            # 不正な牌はキャッシュせずにそのまま判定してエラーを返す
+            return self._check_win(tiles, last_tile, dora, rule)
+        return self.cache.get_or_compute(key, lambda: self._check_win(tiles, last_tile, dora, rule))
+
+    def _check_win(self, tiles, last_tile, dora, rule):
+        try:
+            # 14枚が和了形でなければ点数計算せずに不和了（打牌ごとの判定の大半はここで終わる）
+            if dora:
+                # 形判定だけで不和了を返す場合も、不正なドラ表示牌はエラーにする
+                tile_to_index(dora)
+            with stage("shape"):
+                counts = tiles_to_counts(tiles)
+                counts[tile_to_index(last_tile)] += 1
+                rejected = sum(counts) == 14 and max(counts) <= 4 and not is_winning_shape(counts)
+            if rejected:
+                return {
+                    "isWinning": False,
+                    "error": ERR_HAND_NOT_WINNING
+                }
+
+            result = self.estimate(tiles, last_tile, dora, rule)
+
+            if result.error:
+                return {
+                    "isWinning": False,
+                    "error": result.error
+                }
+
+            return {
+                "isWinning": True,
+                "points": result.cost['main'] if result.cost else 0,
+                "han": result.han,
+                "fu": result.fu,
+                "yaku": [yaku_item.name for yaku_item in result.yaku or []]
+            }
+
+        except Exception as e:
+            return {
+                "isWinning": False,
+                "error": f"和了判定エラー: {str(e)}"
+            }
+
+    def warm_up(self):
+        """
+        点数計算ライブラリを読み込んでおく（常駐するプロセスの起動時用）
+        """
+        self._calculator()
+        self.hand_config(RULE_RIICHI)
+
+    def check_tenpai(self, tiles, dora=None, rule=RULE_RIICHI):
+        """
+        聴牌判定を実行（形判定で求めた待ち候補のみ点数計算で確認する）
+
+        リーチ有りのルールではどの和了形にも役（立直）があるため、形判定の待ちをそのまま返す。
+        """
+        key = self.tenpai_cache_key(tiles, dora, rule)
+        if key is None:
+            return self._check_tenpai(tiles, dora, rule)
+        return self.cache.get_or_compute(key, lambda: self._check_tenpai(tiles, dora, rule))
+
+    def _check_tenpai(self, tiles, dora, rule):
+        try:
+            # 待ちごとの和了判定で手牌を何度も変換しないよう、先に1回だけ検証・変換する
+            tiles = parse_hand(tiles)
+            if dora:
+                # 点数計算を省く場合もドラ表示牌は検証する（以前は点数計算で不正な牌が弾かれていた）
+                tile_to_index(dora)
+            with stage("shape"):
+                waits = find_waits(tiles_to_counts(tiles))
+            if rule.riichi:
+                return {
+                    "isTenpai": len(waits) > 0,
+                    "waitingTiles": [TILE_NAMES[index] for index in waits]
+                }
+            waiting_tiles = []
+            for index in waits:
+                tile = TILE_NAMES[index]
+                if self.check_win(tiles, tile, dora, rule).get("isWinning", False):
+                    waiting_tiles.append(tile)
+
+            return {
+                "isTenpai": len(waiting_tiles) > 0,
+                "waitingTiles": waiting_tiles
+            }
+
+        except Exception as e:
+            return {
+                "isTenpai": False,
+                "waitingTiles": [],
+                "error": f"聴牌判定エラー: {str(e)}"
+            }
+
+
+    def analyze_hand(self, tiles, dora, visible_tiles=None, rule=RULE_RIICHI):
+        """
+        待ち牌ごとの点数と残り枚数をまとめて返す
+
+        待ち牌は形判定で1回だけ求め、各待ちの点数計算（キャッシュ共有）結果を
+        そのまま和了可否・飜・符・点数・役として使う。
+        残り枚数は4枚から自分の手牌・ドラ表示牌・見えている牌（捨て牌など）を引いたもの。
+        """
+        try:
+            tiles = parse_hand(tiles)
+            counts = tiles_to_counts(tiles)
+            seen = list(counts)
+            for tile in [dora] + list(visible_tiles or []):
+                if tile:
+                    seen[tile_to_index(tile)] += 1
+
+            with stage("shape"):
+                candidates = find_waits(counts)
+            waits = []
+            for index in candidates:
+                tile = TILE_NAMES[index]
+                result = self.check_win(tiles, tile, dora, rule)
+                if not result.get("isWinning", False):
+                    continue
+                waits.append({
+                    "tile": tile,
+                    "han": result["han"],
+                    "fu": result["fu"],
+                    "points": result["points"],
+                    "yaku": result["yaku"],
+                    "remaining": max(0, 4 - seen[index])
+                })
+
+            return {
+                "isTenpai": len(waits) > 0,
+                "waits": waits,
+                "totalRemaining": sum(wait["remaining"] for wait in waits)
+            }
+
+        except Exception as e:
+            return {
+                "isTenpai": False,
+                "waits": [],
+                "totalRemaining": 0,
+                "error": f"手牌解析エラー: {str(e)}"
+            }
+
+    def check_win_batch(self, items, rule=RULE_RIICHI):
+        """
+        複数の (tiles, lastTile, dora) をまとめて和了判定し、入力順に結果を返す
+
+        同じ手牌の項目はまとめ、待ち牌の形判定を手牌ごとに1回だけ行う。
+        待ちに含まれない和了牌は点数計算せずに不和了とする。
+        """
+        results = [None] * len(items)
+        groups = {}
+        hands = [None] * len(items)
+        for position, item in enumerate(items):
+            error, hand = _parse_batch_item(item, True)
+            if error:
+                results[position] = {"isWinning": False, "error": error}
+                continue
+            key = self.win_cache_key(hand, item['lastTile'], item['dora'], rule)
+            if key is None:
+                results[position] = self._check_win(hand, item['lastTile'], item['dora'], rule)
+                continue
+            hands[position] = hand
+            groups.setdefault(key[1], []).append(position)
+
+        for counts, positions in groups.items():
+            with stage("shape"):
+                waits = set(find_waits(list(counts)))
+            for position in positions:
+                item = items[position]
+                if tile_to_index(item['lastTile']) in waits:
+                    # 同一の項目はキャッシュにより1回だけ計算される
+                    results[position] = self.check_win(hands[position], item['lastTile'], item['dora'], rule)
+                else:
+                    results[position] = {
+                        "isWinning": False,
+                        "error": ERR_HAND_NOT_WINNING
+                    }
+        return results
+
+    def check_tenpai_batch(self, items, rule=RULE_RIICHI):
+        """
+        複数の (tiles, dora) をまとめて聴牌判定し、入力順に結果を返す
+        """
+        results = []
+        for item in items:
+            error, hand = _parse_batch_item(item, False)
+            if error:
+                results.append({"isTenpai": False, "waitingTiles": [], "error": error})
+            else:
+                results.append(self.check_tenpai(hand, item['dora'], rule))
+        return results
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_engine():
+    """
+    プロセス共通のエンジンを取得
+    """
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = MahjongEngine()
+    return _engine
+
+
+def check_win(tiles, last_tile, dora, rule=RULE_RIICHI):
+    """
+    共有エンジンで和了判定（プロセスプールに渡せるモジュール関数）
+    """
+    return get_engine().check_win(tiles, last_tile, dora, rule)
+
+
+def check_tenpai(tiles, dora=None, rule=RULE_RIICHI):
+    """
+    共有エンジンで聴牌判定（プロセスプールに渡せるモジュール関数）
+    """
+    return get_engine().check_tenpai(tiles, dora, rule)
+
+
+def check_win_batch(items, rule=RULE_RIICHI):
+    """
+    共有エンジンでまとめて和了判定（プロセスプールに渡せるモジュール関数）
+    """
+    return get_engine().check_win_batch(items, rule)
+
+
+def check_tenpai_batch(items, rule=RULE_RIICHI):
+    """
+    共有エンジンでまとめて聴牌判定（プロセスプールに渡せるモジュール関数）
+    """
+    return get_engine().check_tenpai_batch(items, rule)
+
+
+def analyze_hand(tiles, dora, visible_tiles=None, rule=RULE_RIICHI):
+    """
+    共有エンジンで待ち牌の解析（プロセスプールに渡せるモジュール関数）
+    """
+    return get_engine().analyze_hand(tiles, dora, visible_tiles, rule)
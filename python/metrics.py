@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+リクエストの処理時間の計測（段階別タイマー・ヒストグラム・遅いリクエストのサンプリングプロファイル）
+
+判定処理の中では stage("scoring") のように段階を囲むと、計測中の呼び出しに限って
+段階ごとの合計時間と回数を記録する（計測していない呼び出しでは何もしない）。
+プロセスプールのワーカーでは run_instrumented 経由で呼び、結果と一緒に段階別の時間を返す。
+APIサーバー側は Registry にエンドポイント・段階ごとのヒストグラムを持ち、
+Prometheusのテキスト形式で書き出す。
+
+環境変数 MAHJONG_PROFILE_SLOW_MS を指定すると、ワーカーでの処理中にスタックを
+一定間隔でサンプリングし、処理時間がそれを超えた呼び出しだけ
+フレームグラフ用の畳み込み形式（"関数;関数;... 回数"）で MAHJONG_PROFILE_DIR に書き出す。
+"""
+
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+
+# ヒストグラムの区切り（秒）
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# 遅いリクエストのプロファイル（しきい値0で無効）
+PROFILE_SLOW_MS = float(os.environ.get("MAHJONG_PROFILE_SLOW_MS", 0))
+PROFILE_INTERVAL_MS = float(os.environ.get("MAHJONG_PROFILE_INTERVAL_MS", 5))
+PROFILE_DIR = os.environ.get("MAHJONG_PROFILE_DIR", "profiles")
+
+_local = threading.local()
+
+
+# ---- 段階別タイマー ----
+
+class _StageTimer:
+    def __init__(self, timings, name):
+        self.timings = timings
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+
+    def __exit__(self, *exc):
+        add_stage(self.timings, self.name, time.perf_counter() - self.started)
+
+
+# 計測していない呼び出しで使う何もしないコンテキスト（使い回す）
+_NO_STAGE = nullcontext()
+
+
+def stage(name):
+    """
+    処理の段階を計測する（collect_stages の内側でのみ記録される）
+    """
+    timings = getattr(_local, 'timings', None)
+    if timings is None:
+        return _NO_STAGE
+    return _StageTimer(timings, name)
+
+
+def add_stage(timings, name, seconds, calls=1):
+    """
+    段階別の {段階: [合計秒, 回数]} に時間を加える
+    """
+    entry = timings.get(name)
+    if entry is None:
+        timings[name] = [seconds, calls]
+    else:
+        entry[0] += seconds
+        entry[1] += calls
+
+
+@contextmanager
+def collect_stages():
+    """
+    このスレッドでの段階別の {段階: [合計秒, 回数]} を集める
+    """
+    previous = getattr(_local, 'timings', None)
+    timings = {}
+    _local.timings = timings
+    try:
+        yield timings
+    finally:
+        _local.timings = previous
+
+
+def run_instrumented(func, *args):
+    """
+    func(*args) を実行し、(結果, 段階別の時間) を返す（プロセスプールに渡せるモジュール関数）
+    """
+    profiler = _profiler() if PROFILE_SLOW_MS > 0 else None
+    with collect_stages() as timings:
+        if profiler is None:
+            return func(*args), timings
+        with profiler.sampling(getattr(func, '__name__', 'call'), run_instrumented.__code__):
+            return func(*args), timings
+
+
+# ---- サンプリングプロファイラー ----
+
+class SamplingProfiler:
+    """
+    対象スレッドのスタックを別スレッドから一定間隔で読み取り、遅かった呼び出しだけ書き出す
+    """
+
+    def __init__(self, slow_ms=PROFILE_SLOW_MS, interval_ms=PROFILE_INTERVAL_MS, directory=PROFILE_DIR):
+        self.slow_ms = slow_ms
+        self.interval = interval_ms / 1000
+        self.directory = directory
+        self._target = None
+        self._root = None
+        self._stacks = Counter()
+        self._lock = threading.Lock()
+        self._thread = None
+        self.dumped = 0
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            target = self._target
+            if target is None:
+                continue
+            frame = sys._current_frames().get(target)
+            if frame is None:
+                continue
+            stack = []
+            root = self._root
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                if code is root:
+                    break
+                frame = frame.f_back
+            with self._lock:
+                if self._target == target:
+                    self._stacks[";".join(reversed(stack))] += 1
+
+    @contextmanager
+    def sampling(self, label, root=None):
+        """
+        ブロック内の処理をサンプリングし、しきい値を超えたら畳み込み形式で書き出す
+
+        root（コードオブジェクト）を渡すと、スタックをその関数より外側に遡らない。
+        """
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+            self._thread.start()
+        with self._lock:
+            self._stacks = Counter()
+            self._root = root
+            self._target = threading.get_ident()
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            with self._lock:
+                self._target = None
+                stacks = self._stacks
+            if elapsed_ms >= self.slow_ms and stacks:
+                self.dump(label, elapsed_ms, stacks)
+
+    def dump(self, label, elapsed_ms, stacks):
+        os.makedirs(self.directory, exist_ok=True)
+        name = f"{int(time.time() * 1000)}-{os.getpid()}-{label}-{int(elapsed_ms)}ms.folded"
+        with open(os.path.join(self.directory, name), "w", encoding="utf-8") as f:
+            for stack, count in stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        self.dumped += 1
+
+
+_profiler_instance = None
+
+
+def _profiler():
+    global _profiler_instance
+    if _profiler_instance is None:
+        _profiler_instance = SamplingProfiler()
+    return _profiler_instance
+
+
+# ---- 集計と書き出し ----
+
+class Histogram:
+    """
+    累積バケット形式のヒストグラム（Prometheusのhistogramと同じ）
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.sum += value
+        self.count += 1
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(labels):
+    return ",".join(f'{k}="{_escape(v)}"' for k, v in labels)
+
+
+class Registry:
+    """
+    ラベル付きのヒストグラム・カウンターを保持し、Prometheusのテキスト形式で書き出す
+    """
+
+    def __init__(self):
+        self._histograms = {}
+        self._counters = {}
+        self._help = {}
+        self._lock = threading.Lock()
+
+    def observe(self, name, value, help_text="", **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+                self._help.setdefault(name, ('histogram', help_text))
+            histogram.observe(value)
+
+    def increment(self, name, amount=1, help_text="", **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+            self._help.setdefault(name, ('counter', help_text))
+
+    def observe_stages(self, timings, **labels):
+        """
+        run_instrumented が返した段階別の時間を記録する
+        """
+        for name, (seconds, calls) in timings.items():
+            self.observe("mahjong_stage_seconds", seconds, "リクエストあたりの段階別処理時間",
+                         stage=name, **labels)
+            self.increment("mahjong_stage_calls_total", calls, "段階別の呼び出し回数", stage=name, **labels)
+
+    def render(self, extra=None):
+        """
+        Prometheusのテキスト形式（extra は {名前: (種類, 説明, 値)} の追加の値）
+        """
+        lines = []
+        with self._lock:
+            names = sorted({key[0] for key in self._histograms} | {key[0] for key in self._counters})
+            for name in names:
+                kind, help_text = self._help[name]
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                if kind == 'counter':
+                    for (metric, labels), value in sorted(self._counters.items()):
+                        if metric == name:
+                            lines.append(f"{name}{{{_labels(labels)}}} {value}")
+                    continue
+                for (metric, labels), histogram in sorted(self._histograms.items()):
+                    if metric != name:
+                        continue
+                    cumulative = 0
+                    for bound, count in zip(histogram.buckets + (float('inf'),), histogram.counts):
+                        cumulative += count
+                        le = "+Inf" if bound == float('inf') else repr(bound)
+                        lines.append(f"{name}_bucket{{{_labels(labels + (('le', le),))}}} {cumulative}")
+                    lines.append(f"{name}_sum{{{_labels(labels)}}} {histogram.sum:.6f}")
+                    lines.append(f"{name}_count{{{_labels(labels)}}} {histogram.count}")
+        for name, (kind, help_text, value) in sorted((extra or {}).items()):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.append(f"{name} {value}")
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+判定結果のLRU/TTLキャッシュ
+
+キーは手牌を34種の枚数ベクトルに正規化したもの（牌の並び順や発/發の表記揺れを吸収）と
+和了牌・ドラ表示牌・ルール設定の組。
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+from tile_codec import ParsedHand, tile_to_index, tiles_to_counts
+
+
+def hand_key(tiles):
+    """
+    手牌の正規化キー（34バイトの枚数ベクトル）
+    """
+    if type(tiles) is ParsedHand:
+        return tiles.counts
+    return bytes(tiles_to_counts(tiles))
+
+
+def tile_key(tile):
+    """
+    牌1枚の正規化キー（34種インデックス、未指定は-1）
+    """
+    return tile_to_index(tile) if tile else -1
+
+
+class ResultCache:
+    """
+    スレッドセーフなLRUキャッシュ（任意でTTL付き）
+
+    格納した値はそのまま返すため、呼び出し側で変更しないこと。
+    """
+
+    def __init__(self, maxsize=4096, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key):
+        """
+        (見つかったか, 値) を返す
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return False, None
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return False, None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return True, value
+
+    def put(self, key, value):
+        if self.maxsize <= 0:
+            return
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_compute(self, key, compute):
+        """
+        キャッシュにあればそれを返し、無ければ計算して格納する
+        """
+        found, value = self.get(key)
+        if found:
+            return value
+        value = compute()
+        self.put(key, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hitRate": self.hits / lookups if lookups else 0.0
+            }
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+点数計算のルール設定
+
+和了の種類（ツモ・ロン）・リーチ・一発・自風・場風・赤ドラの有無をまとめた不変の値。
+ハッシュ可能なので判定結果キャッシュのキーにそのまま使え、
+点数計算ライブラリの HandConfig には判定エンジン側で設定ごとに1回だけ変換する。
+"""
+
+from dataclasses import asdict, dataclass
+from typing import Optional
+
+from tile_codec import tile_to_index
+
+# 風牌（34種インデックスは点数計算ライブラリの風の定数と同じ）
+WINDS = ('東', '南', '西', '北')
+
+# APIで受け付けるキー（JSONのキー→フィールド名）
+_FIELDS = {
+    'tsumo': 'tsumo',
+    'riichi': 'riichi',
+    'ippatsu': 'ippatsu',
+    'seatWind': 'seat_wind',
+    'roundWind': 'round_wind',
+    'akaDora': 'aka_dora',
+}
+
+
+@dataclass(frozen=True)
+class RuleConfig:
+    """
+    1回の和了判定に適用するルール
+
+    風を指定しない場合は風牌の役牌を数えない（従来の判定と同じ）。
+    自風が東なら親として点数を計算する。
+    """
+    tsumo: bool = False
+    riichi: bool = True
+    ippatsu: bool = False
+    seat_wind: Optional[str] = None
+    round_wind: Optional[str] = None
+    aka_dora: bool = False
+
+    def __post_init__(self):
+        for wind in (self.seat_wind, self.round_wind):
+            if wind is not None and wind not in WINDS:
+                raise ValueError(f"不正な風: {wind}")
+        if self.ippatsu and not self.riichi:
+            raise ValueError("一発はリーチ時のみ指定できます")
+
+    @classmethod
+    def from_dict(cls, data, base=None):
+        """
+        APIの入力（tsumo・riichi・ippatsu・seatWind・roundWind・akaDora）から作る
+
+        指定の無い項目は base（省略時は既定のルール）の値を使う。
+        """
+        base = base or DEFAULT_RULE
+        if not data:
+            return base
+        if not isinstance(data, dict):
+            raise ValueError("ルール設定の形式が不正です")
+        unknown = [key for key in data if key not in _FIELDS]
+        if unknown:
+            raise ValueError(f"不明なルール設定: {', '.join(unknown)}")
+        values = asdict(base)
+        for key, value in data.items():
+            values[_FIELDS[key]] = value
+        for key in ('tsumo', 'riichi', 'ippatsu', 'akaDora'):
+            if not isinstance(values[_FIELDS[key]], bool):
+                raise ValueError(f"ルール設定 {key} は真偽値で指定してください")
+        return cls(**values)
+
+    def to_dict(self):
+        return {key: getattr(self, name) for key, name in _FIELDS.items()}
+
+    def hand_config(self):
+        """
+        点数計算ライブラリの HandConfig に変換（ライブラリは変換が必要になった時点で読み込む）
+        """
+        from mahjong.hand_calculating.hand_config import HandConfig, OptionalRules
+        return HandConfig(
+            is_tsumo=self.tsumo,
+            is_riichi=self.riichi,
+            is_ippatsu=self.ippatsu,
+            player_wind=tile_to_index(self.seat_wind) if self.seat_wind else None,
+            round_wind=tile_to_index(self.round_wind) if self.round_wind else None,
+            options=OptionalRules(has_aka_dora=self.aka_dora)
+        )
+
+
+# このゲームの既定（ロン和了・常時リーチ）と、よく使う設定
+DEFAULT_RULE = RuleConfig()
+TSUMO_RULE = RuleConfig(tsumo=True)
+NO_RIICHI_RULE = RuleConfig(riichi=False)
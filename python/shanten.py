@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+向聴数と受け入れ（有効牌）の計算
+
+通常形・七対子・国士無双の向聴数を34種の枚数ベクトルから求める。
+通常形は色ごとのブロック構成（面子・塔子・雀頭の数）の候補をメモ化して共有し、
+4グループの候補を組み合わせて最小値を取る。
+-1 は和了形、0 は聴牌を表す。
+"""
+
+from functools import lru_cache
+from itertools import product
+
+from hand_shape import TERMINAL_HONOR_INDICES
+from tile_codec import TILE_NAMES, tiles_to_counts
+
+
+def _dominated(option, options):
+    return any(
+        other != option and all(o >= v for o, v in zip(other, option))
+        for other in options
+    )
+
+
+# グループの候補のメモ化の上限（常駐プロセスで際限なく増えないよう、古いものから捨てる）
+_OPTIONS_CACHE_LIMIT = 1 << 16
+
+
+@lru_cache(maxsize=_OPTIONS_CACHE_LIMIT)
+def _group_options(group, allow_sequences, quads, head_taken=0):
+    """
+    1グループの枚数パターンから取り得るブロック構成の候補（劣る組は除く）
+
+    候補は (面子数, 塔子数, 雀頭数, 生きた孤立牌あり, 孤立牌なし) の組。
+    quads は元の手牌で4枚持っている位置のビットマスクで、
+    その牌を待つ対子塔子や孤立牌は有効な待ちにならないものとして扱う。
+    head_taken は4枚持ちの牌で既に対子を1組抜いた位置（残りの2枚は対子にしない）。
+    """
+    i = 0
+    while i < len(group) and group[i] == 0:
+        i += 1
+    if i == len(group):
+        return ((0, 0, 0, 0, 1),)
+
+    options = set()
+    rest = list(group)
+    is_quad = quads >> i & 1
+
+    def collect(delta, *removals, taken=head_taken):
+        for index, amount in removals:
+            rest[index] -= amount
+        for option in _group_options(tuple(rest), allow_sequences, quads, taken):
+            options.add(tuple(o + d for o, d in zip(option, delta)))
+        for index, amount in removals:
+            rest[index] += amount
+
+    # 孤立牌として扱う（4枚使い切りの牌は単騎待ちにできない）
+    for option in _group_options(tuple(rest[:i] + [rest[i] - 1] + rest[i + 1:]), allow_sequences, quads, head_taken):
+        m, t, p, free, none = option
+        options.add((m, t, p, max(free, 0 if is_quad else 1), 0))
+    # 刻子
+    if rest[i] >= 3:
+        collect((1, 0, 0, 0, 0), (i, 3))
+    # 対子（雀頭、または4枚目が残っていれば対子塔子）
+    if rest[i] >= 2 and not head_taken >> i & 1:
+        collect((0, 0, 1, 0, 0), (i, 2), taken=head_taken | (is_quad << i))
+        if not is_quad:
+            collect((0, 1, 0, 0, 0), (i, 2))
+    if allow_sequences:
+        # 順子
+        if i <= 6 and rest[i + 1] > 0 and rest[i + 2] > 0:
+            collect((1, 0, 0, 0, 0), (i, 1), (i + 1, 1), (i + 2, 1))
+        # 両面・辺張
+        if i <= 7 and rest[i + 1] > 0:
+            collect((0, 1, 0, 0, 0), (i, 1), (i + 1, 1))
+        # 嵌張
+        if i <= 6 and rest[i + 2] > 0:
+            collect((0, 1, 0, 0, 0), (i, 1), (i + 2, 1))
+
+    # 雀頭は手牌全体で1組までしか数えない（2組目以降は塔子扱い）
+    options = {(m, t + max(0, p - 1), min(p, 1), free, none) for m, t, p, free, none in options}
+    return tuple(sorted(o for o in options if not _dominated(o, options)))
+
+
+def _groups(counts):
+    def quads(start, end):
+        mask = 0
+        for offset, count in enumerate(counts[start:end]):
+            if count == 4:
+                mask |= 1 << offset
+        return mask
+
+    return (
+        (tuple(counts[0:9]), True, quads(0, 9)),
+        (tuple(counts[9:18]), True, quads(9, 18)),
+        (tuple(counts[18:27]), True, quads(18, 27)),
+        (tuple(counts[27:34]), False, quads(27, 34)),
+    )
+
+
+def _combine(group_options):
+    """
+    4グループの候補を組み合わせて通常形の向聴数を求める
+    """
+    best = 8
+    for combination in product(*group_options):
+        melds = sum(option[0] for option in combination)
+        taatsu = sum(option[1] for option in combination)
+        pairs = sum(option[2] for option in combination)
+        if pairs > 1:
+            # 2組目以降の対子は塔子として数える
+            taatsu += pairs - 1
+            pairs = 1
+        shanten = 8 - 2 * melds - min(taatsu, 4 - melds) - pairs
+        # 雀頭が無く、孤立牌が全て4枚使い切りの牌なら雀頭候補が作れない
+        if not pairs and not any(option[3] for option in combination) and \
+                not all(option[4] for option in combination):
+            shanten += 1
+        best = min(best, shanten)
+    return best
+
+
+def _apply_honor_quads(shanten, counts):
+    """
+    4枚持ちの字牌は1枚が必ず浮くため、その数より向聴数は小さくならない
+    """
+    if shanten < 0:
+        return shanten
+    honor_quads = sum(1 for c in counts[27:34] if c == 4)
+    if honor_quads and sum(counts) % 3 == 2:
+        honor_quads -= 1
+    return max(shanten, honor_quads)
+
+
+def standard_shanten(counts):
+    """
+    通常形（4面子1雀頭）の向聴数
+    """
+    return _apply_honor_quads(_combine([_group_options(*group) for group in _groups(counts)]), counts)
+
+
+def chiitoitsu_shanten(counts):
+    """
+    七対子の向聴数（同一牌4枚は1対子）
+    """
+    pairs = sum(1 for c in counts if c >= 2)
+    kinds = sum(1 for c in counts if c >= 1)
+    return 6 - pairs + max(0, 7 - kinds)
+
+
+def kokushi_shanten(counts):
+    """
+    国士無双の向聴数
+    """
+    kinds = sum(1 for i in TERMINAL_HONOR_INDICES if counts[i] >= 1)
+    has_pair = any(counts[i] >= 2 for i in TERMINAL_HONOR_INDICES)
+    return 13 - kinds - (1 if has_pair else 0)
+
+
+def calculate_shanten(counts):
+    """
+    各形の向聴数と、その最小値を返す
+    """
+    standard = standard_shanten(counts)
+    chiitoitsu = chiitoitsu_shanten(counts)
+    kokushi = kokushi_shanten(counts)
+    return {
+        "shanten": min(standard, chiitoitsu, kokushi),
+        "standard": standard,
+        "chiitoitsu": chiitoitsu,
+        "kokushi": kokushi
+    }
+
+
+class ShantenState:
+    """
+    1枚の追加・削除に合わせて向聴数を差分更新する手牌状態
+
+    変化したグループの候補だけを引き直し、他のグループの候補はそのまま使う。
+    """
+
+    def __init__(self, counts):
+        self.counts = list(counts)
+        self._options = [_group_options(*group) for group in _groups(self.counts)]
+        self._standard = None
+
+    def _refresh_group(self, index):
+        g = min(index // 9, 3)
+        self._options[g] = _group_options(*_groups(self.counts)[g])
+        self._standard = None
+
+    def add(self, index):
+        self.counts[index] += 1
+        self._refresh_group(index)
+
+    def remove(self, index):
+        if self.counts[index] <= 0:
+            raise ValueError(f"手牌に無い牌は抜けません: {TILE_NAMES[index]}")
+        self.counts[index] -= 1
+        self._refresh_group(index)
+
+    @property
+    def shanten(self):
+        if self._standard is None:
+            self._standard = _apply_honor_quads(_combine(self._options), self.counts)
+        return min(self._standard, chiitoitsu_shanten(self.counts), kokushi_shanten(self.counts))
+
+    def ukeire(self, seen=None):
+        """
+        向聴数を下げる牌と残り枚数の一覧（13枚形で使う）
+
+        seen は手牌以外で見えている牌の枚数ベクトル。
+        """
+        current = self.shanten
+        accepted = []
+        for index in range(34):
+            if self.counts[index] >= 4:
+                continue
+            self.add(index)
+            improves = self.shanten < current
+            self.remove(index)
+            if improves:
+                remaining = 4 - self.counts[index] - (seen[index] if seen else 0)
+                accepted.append((index, max(0, remaining)))
+        return accepted
+
+
+def _ukeire_summary(accepted):
+    return {
+        "ukeire": [{"tile": TILE_NAMES[index], "remaining": remaining} for index, remaining in accepted],
+        "ukeireCount": sum(remaining for _, remaining in accepted)
+    }
+
+
+def analyze_shanten(counts, seen=None):
+    """
+    13枚または14枚の手牌の向聴数と受け入れを返す
+
+    14枚の場合は打牌候補ごとの向聴数・受け入れも返す（良い順）。
+    """
+    state = ShantenState(counts)
+    result = calculate_shanten(state.counts)
+
+    if sum(state.counts) % 3 == 1:
+        result.update(_ukeire_summary(state.ukeire(seen)))
+        return result
+
+    discards = []
+    for index in range(34):
+        if state.counts[index] == 0:
+            continue
+        state.remove(index)
+        option = {"discard": TILE_NAMES[index], "shanten": state.shanten}
+        option.update(_ukeire_summary(state.ukeire(seen)))
+        discards.append(option)
+        state.add(index)
+    discards.sort(key=lambda option: (option["shanten"], -option["ukeireCount"]))
+    result["discards"] = discards
+    return result
+
+
+def analyze_tiles(tiles, visible_tiles=None):
+    """
+    牌文字列の手牌から向聴数と受け入れを求める（APIから呼ぶ入口）
+
+    visible_tiles は捨て牌・ドラ表示牌など手牌以外で見えている牌。
+    """
+    counts = tiles_to_counts(tiles)
+    if any(c > 4 for c in counts):
+        raise ValueError("同じ牌は4枚までです")
+    seen = tiles_to_counts(visible_tiles) if visible_tiles else None
+    return analyze_shanten(counts, seen)
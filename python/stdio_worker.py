@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+常駐ワーカーモード（標準入出力での改行区切りJSON）
+
+Next.jsから起動されたPythonプロセスを使い回すためのループ。
+1行に1リクエスト {"id": ..., ...} を受け取り、
+同じidを付けて {"id": ..., "result": {...}} または {"id": ..., "error": "..."} を1行で返す。
+idで応答を対応付けるため、呼び出し側は複数のリクエストを同時に送ってよい。
+"""
+
+import json
+import sys
+
+
+def serve(handle, stdin=None, stdout=None):
+    """
+    標準入力が閉じられるまでリクエストを処理する
+    """
+    stdin = stdin or sys.stdin
+    stdout = stdout or sys.stdout
+    for line in stdin:
+        line = line.strip()
+        if not line:
+            continue
+        request_id = None
+        try:
+            request = json.loads(line)
+            request_id = request.pop('id', None)
+            response = {"id": request_id, "result": handle(request)}
+        except Exception as e:
+            response = {"id": request_id, "error": str(e)}
+        stdout.write(json.dumps(response, ensure_ascii=False) + "\n")
+        stdout.flush()
+
+
+def is_worker_mode():
+    """
+    コマンドライン引数に --worker が指定されているか
+    """
+    return '--worker' in sys.argv[1:]
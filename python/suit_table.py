@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+色ごとの枚数パターンに対する分解可否・待ち牌の事前計算テーブル
+
+数牌1色（9種）と字牌（7種）の枚数パターンを5進数のキーに変換し、
+「面子のみで完成」「面子+雀頭で完成」「1枚加えて完成する牌」を
+1つの32bit値にまとめて保持する。テーブルは generate_suit_table.py で生成し、
+サーバー起動時にmmapで読み込む。
+"""
+
+import hashlib
+import mmap
+import os
+import struct
+import sys
+from array import array
+from bisect import bisect_left
+
+# エントリのビット配置
+COMPLETE = 1 << 0            # 面子のみで完成
+COMPLETE_WITH_PAIR = 1 << 1  # 面子+雀頭1組で完成
+WAIT_SHIFT = 2               # bit 2-10: 1枚加えて面子のみで完成する牌
+WAIT_WITH_PAIR_SHIFT = 11    # bit 11-19: 1枚加えて面子+雀頭で完成する牌
+WAIT_MASK = 0x1FF
+
+# 字牌パターンのキーは数牌パターンのキー空間の後ろに置く
+HONOR_KEY_BASE = 5 ** 9
+
+MAGIC = b'MJST'
+VERSION = 1
+_HEADER = struct.Struct('<4sII')
+
+DEFAULT_TABLE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'suit_table.bin')
+
+
+def suit_key(counts):
+    """
+    数牌1色の枚数パターン（長さ9）を5進数のキーに変換
+    """
+    key = 0
+    for count in reversed(counts):
+        key = key * 5 + count
+    return key
+
+
+def honor_key(counts):
+    """
+    字牌の枚数パターン（長さ7）をキーに変換
+    """
+    key = 0
+    for count in reversed(counts):
+        key = key * 5 + count
+    return HONOR_KEY_BASE + key
+
+
+def _complete_patterns(size, allow_sequences):
+    """
+    面子（と雀頭）だけで構成される枚数パターンを列挙
+
+    戻り値は (パターン, 雀頭を含むか) の組を集めたset。
+    """
+    melds = []
+    for i in range(size):
+        meld = [0] * size
+        meld[i] = 3
+        melds.append(tuple(meld))
+    if allow_sequences:
+        for i in range(size - 2):
+            meld = [0] * size
+            meld[i] = meld[i + 1] = meld[i + 2] = 1
+            melds.append(tuple(meld))
+
+    found = set()
+    start = (0,) * size
+    frontier = {start}
+    # 面子は最大4組
+    for _ in range(5):
+        next_frontier = set()
+        for pattern in frontier:
+            found.add((pattern, False))
+            for meld in melds:
+                added = tuple(a + b for a, b in zip(pattern, meld))
+                if max(added) <= 4 and sum(added) <= 12:
+                    next_frontier.add(added)
+        frontier = next_frontier
+
+    with_pair = set()
+    for pattern, _ in found:
+        for i in range(size):
+            if pattern[i] <= 2:
+                added = list(pattern)
+                added[i] += 2
+                with_pair.add((tuple(added), True))
+    return found | with_pair
+
+
+def _build_entries(size, allow_sequences, key_func):
+    entries = {}
+    for pattern, has_pair in _complete_patterns(size, allow_sequences):
+        key = key_func(pattern)
+        entries[key] = entries.get(key, 0) | (COMPLETE_WITH_PAIR if has_pair else COMPLETE)
+        # 1枚抜いたパターンはその牌を待つ
+        shift = WAIT_WITH_PAIR_SHIFT if has_pair else WAIT_SHIFT
+        for i in range(size):
+            if pattern[i] > 0:
+                removed = list(pattern)
+                removed[i] -= 1
+                removed_key = key_func(removed)
+                entries[removed_key] = entries.get(removed_key, 0) | (1 << (shift + i))
+    return entries
+
+
+def build_table():
+    """
+    テーブルを構築し、キー昇順の (keys, values) を返す
+    """
+    entries = _build_entries(9, True, suit_key)
+    entries.update(_build_entries(7, False, honor_key))
+    keys = array('I', sorted(entries))
+    values = array('I', (entries[key] for key in keys))
+    return keys, values
+
+
+def _serialize(keys, values):
+    if sys.byteorder != 'little':
+        keys = array('I', keys)
+        values = array('I', values)
+        keys.byteswap()
+        values.byteswap()
+    return _HEADER.pack(MAGIC, VERSION, len(keys)) + keys.tobytes() + values.tobytes()
+
+
+def save_table(path=DEFAULT_TABLE_PATH):
+    """
+    テーブルを生成してファイルに保存し、SHA-256チェックサムを返す
+    """
+    data = _serialize(*build_table())
+    checksum = hashlib.sha256(data).hexdigest()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+    with open(path + '.sha256', 'w') as f:
+        f.write(f"{checksum}  {os.path.basename(path)}\n")
+    return checksum
+
+
+class SuitTable:
+    """
+    キー昇順に並んだテーブルを二分探索で引く
+    """
+
+    def __init__(self, keys, values, source=None):
+        self._keys = keys
+        self._values = values
+        self.source = source
+
+    def __len__(self):
+        return len(self._keys)
+
+    def lookup(self, key):
+        """
+        キーに対応するエントリ（該当なしは0）
+        """
+        index = bisect_left(self._keys, key)
+        if index < len(self._keys) and self._keys[index] == key:
+            return self._values[index]
+        return 0
+
+    def arrays(self):
+        """
+        キー・値の配列（まとめて引く処理向け）
+        """
+        return self._keys, self._values
+
+    def suit(self, counts):
+        return self.lookup(suit_key(counts))
+
+    def honors(self, counts):
+        return self.lookup(honor_key(counts))
+
+
+def _verify_checksum(path, data):
+    checksum_path = path + '.sha256'
+    with open(checksum_path) as f:
+        expected = f.read().split()[0]
+    actual = hashlib.sha256(data).hexdigest()
+    if actual != expected:
+        raise ValueError(f"チェックサム不一致: {path}")
+
+
+def load_table(path=DEFAULT_TABLE_PATH):
+    """
+    保存済みテーブルをmmapで読み込む
+    """
+    with open(path, 'rb') as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    _verify_checksum(path, mapped)
+    magic, version, count = _HEADER.unpack_from(mapped, 0)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"テーブル形式が不正です: {path}")
+    if sys.byteorder != 'little':
+        raise ValueError("mmap読み込みはリトルエンディアン環境のみ対応しています")
+    view = memoryview(mapped)
+    offset = _HEADER.size
+    keys = view[offset:offset + count * 4].cast('I')
+    values = view[offset + count * 4:offset + count * 8].cast('I')
+    return SuitTable(keys, values, source=path)
+
+
+_table = None
+
+
+def get_table():
+    """
+    プロセス共通のテーブルを取得
+
+    ファイルが無い・壊れている場合はメモリ上で構築する。
+    """
+    global _table
+    if _table is None:
+        try:
+            _table = load_table()
+        except (OSError, ValueError, struct.error) as e:
+            print(f"suit_table: {e} のためテーブルをメモリ上で構築します", file=sys.stderr)
+            keys, values = build_table()
+            _table = SuitTable(keys, values, source='memory')
+    return _table
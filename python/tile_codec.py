@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+牌文字列と34種・136枚インデックスの相互変換
+
+牌文字列→34種インデックスの対応は起動時に1回だけ作る静的な表で引き、
+点数計算ライブラリ用の136枚インデックスも文字列の組み立て（TilesConverter）を経由せず
+1回の走査で求める。136枚インデックスは 34種インデックス×4+何枚目か。
+複数の手牌はN×34の枚数行列（行優先の連続したバイト列）としてまとめて変換する。
+APIの入力は parse_hand で1回だけ走査して検証し、枚数ベクトルと赤ドラを持つ ParsedHand にしておくと、
+キャッシュキー・形判定などは同じ手牌を何度も変換せずに済む。
+"""
+
+# 34種の牌名（インデックス順: 萬子→筒子→索子→字牌）
+TILE_NAMES = (
+    [f"{n}m" for n in range(1, 10)] +
+    [f"{n}p" for n in range(1, 10)] +
+    [f"{n}s" for n in range(1, 10)] +
+    ['東', '南', '西', '北', '白', '發', '中']
+)
+
+# 赤ドラの5（0m・0p・0s）。34種では通常の5と同じ牌として数える
+RED_FIVES = {'0m': 4, '0p': 13, '0s': 22}
+_FIVE_INDICES = frozenset(RED_FIVES.values())
+
+# 牌文字列→34種インデックス（別表記の 発・1z〜7z と赤ドラを含む）
+TILE_INDEX = {name: index for index, name in enumerate(TILE_NAMES)}
+TILE_INDEX['発'] = 32
+TILE_INDEX.update({f"{n}z": 26 + n for n in range(1, 8)})
+TILE_INDEX.update(RED_FIVES)
+
+
+def tile_to_index(tile):
+    """
+    牌文字列を34種インデックスに変換
+    """
+    index = TILE_INDEX.get(tile)
+    if index is None:
+        raise ValueError(f"不正な牌: {tile}")
+    return index
+
+
+class ParsedHand:
+    """
+    検証済みの手牌（入力どおりの牌文字列・34種の枚数ベクトル・赤ドラ）
+
+    牌文字列のリストとして反復できるので、牌文字列のリストを受け取る関数にそのまま渡せる。
+    """
+    __slots__ = ('tiles', 'counts', 'red')
+
+    def __init__(self, tiles, counts, red):
+        self.tiles = tiles
+        self.counts = counts
+        self.red = red
+
+    def __iter__(self):
+        return iter(self.tiles)
+
+    def __len__(self):
+        return len(self.tiles)
+
+    def __getitem__(self, index):
+        return self.tiles[index]
+
+
+def parse_hand(tiles, size=None):
+    """
+    牌文字列のリストを1回の走査で検証し（牌の種類・同じ牌4枚まで・赤ドラ各色1枚まで・枚数）、
+    ParsedHand に変換する
+    """
+    if type(tiles) is ParsedHand:
+        hand = tiles
+    else:
+        if not isinstance(tiles, (list, tuple)):
+            raise ValueError("手牌の形式が不正です")
+        lookup = TILE_INDEX
+        counts = bytearray(34)
+        red = []
+        for tile in tiles:
+            index = lookup.get(tile) if type(tile) is str else None
+            if index is None:
+                raise ValueError(f"不正な牌: {tile}")
+            if counts[index] == 4:
+                raise ValueError(f"同じ牌は4枚までです: {tile}")
+            counts[index] += 1
+            if tile[0] == '0':
+                if tile in red:
+                    raise ValueError(f"赤ドラは各色1枚までです: {tile}")
+                red.append(tile)
+        hand = ParsedHand(list(tiles), bytes(counts), tuple(sorted(red)))
+    if size is not None and len(hand.tiles) != size:
+        raise ValueError(f"手牌は{size}枚である必要があります")
+    return hand
+
+
+def parse_added_tile(hand, tile):
+    """
+    検証済みの手牌に加える1枚（和了牌など）を検証して34種インデックスを返す
+    """
+    index = tile_to_index(tile)
+    if hand.counts[index] == 4:
+        raise ValueError(f"同じ牌は4枚までです: {tile}")
+    if tile in hand.red:
+        raise ValueError(f"赤ドラは各色1枚までです: {tile}")
+    return index
+
+
+def red_key(tiles):
+    """
+    手牌に含まれる赤ドラ（キャッシュキー用、含まなければ空のタプル）
+    """
+    if type(tiles) is ParsedHand:
+        return tiles.red
+    return tuple(sorted(tile for tile in tiles if tile in RED_FIVES))
+
+
+def tiles_to_counts(tiles):
+    """
+    牌文字列のリストを34種の枚数ベクトルに変換
+    """
+    if type(tiles) is ParsedHand:
+        return list(tiles.counts)
+    counts = [0] * 34
+    for tile in tiles:
+        counts[tile_to_index(tile)] += 1
+    return counts
+
+
+def counts_to_tiles(counts, names=TILE_NAMES):
+    """
+    34種の枚数ベクトルを牌文字列のリストに戻す
+    """
+    tiles = []
+    for index, count in enumerate(counts):
+        if count:
+            tiles.extend([names[index]] * count)
+    return tiles
+
+
+def encode_136(tiles, last_tile=None):
+    """
+    手牌（+和了牌）を136枚インデックスの昇順リストに変換
+
+    同じ牌は出てきた順に 0〜3 枚目を割り当てる。
+    5は0枚目を赤ドラ（0m・0p・0s）用に取っておき、通常の5は1〜3枚目から割り当てる
+    （点数計算ライブラリは赤ドラ有りのルールで各色の5の0枚目を赤ドラとみなす）。
+    和了牌を渡した場合は、和了牌に割り当てた136枚インデックスも返す。
+    """
+    used = [0] * 34
+    red = [False] * 34
+    tiles_136 = []
+    for tile in tiles:
+        tiles_136.append(_assign_136(tile, used, red))
+
+    if last_tile is None:
+        tiles_136.sort()
+        return tiles_136
+
+    win_tile = _assign_136(last_tile, used, red)
+    tiles_136.append(win_tile)
+    tiles_136.sort()
+    return tiles_136, win_tile
+
+
+def _assign_136(tile, used, red):
+    """
+    牌1枚に136枚インデックスを割り当てる（used・red は割り当て済みの枚数と赤ドラの有無）
+    """
+    index = tile_to_index(tile)
+    if used[index] >= 4:
+        raise ValueError(f"同じ牌は4枚までです: {tile}")
+    used[index] += 1
+    if index not in _FIVE_INDICES:
+        return index * 4 + used[index] - 1
+    if tile in RED_FIVES:
+        if red[index]:
+            raise ValueError(f"赤ドラは各色1枚までです: {tile}")
+        red[index] = True
+        return index * 4
+    # 通常の5は1〜3枚目、4枚とも通常の5なら最後の1枚に0枚目を使う
+    normal = used[index] - red[index]
+    return index * 4 + (normal if normal < 4 else 0)
+
+
+def decode_136(tiles_136):
+    """
+    136枚インデックスのリストを牌文字列のリストに戻す
+    """
+    return [TILE_NAMES[tile // 4] for tile in tiles_136]
+
+
+def encode_batch(hands):
+    """
+    複数の手牌をN×34の枚数行列（行優先のbytearray）にまとめて変換
+
+    numpy.frombuffer(matrix, dtype=numpy.uint8).reshape(-1, 34) でコピーせずに行列として扱える。
+    """
+    matrix = bytearray(34 * len(hands))
+    lookup = TILE_INDEX
+    for row, tiles in enumerate(hands):
+        offset = row * 34
+        for tile in tiles:
+            index = lookup.get(tile)
+            if index is None:
+                raise ValueError(f"不正な牌: {tile}（{row}件目）")
+            matrix[offset + index] += 1
+    return matrix
+
+
+def decode_batch(matrix, names=TILE_NAMES):
+    """
+    N×34の枚数行列（バイト列）を手牌ごとの牌文字列のリストに戻す
+    """
+    if len(matrix) % 34:
+        raise ValueError("枚数行列の長さが34の倍数ではありません")
+    view = memoryview(matrix)
+    return [counts_to_tiles(view[offset:offset + 34], names) for offset in range(0, len(matrix), 34)]
+
+
+def batch_rows(matrix):
+    """
+    N×34の枚数行列を1行ずつ（34バイトのbytes）取り出す
+    """
+    view = memoryview(matrix)
+    for offset in range(0, len(matrix), 34):
+        yield bytes(view[offset:offset + 34])
@@ -0,0 +1,386 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+判定処理の整合性チェック
+
+固定シードの無作為な手牌で、独自実装の判定が基準となる実装と一致するかを確かめる。
+テーブル・枝刈りを変更したときに結果が黙って変わらないよう、benchmark.py と合わせて実行する。
+
+  shanten: shanten.py の向聴数を点数計算ライブラリ（mahjong.shanten）と比べる。
+    既知の違い（独自実装が意図して厳しく数えるもの）は許容する:
+      - 通常形: 4枚持ちの牌を待つ形（空聴）は聴牌と数えないため、4枚持ちの手に限り大きくてよい
+      - 七対子: 同じ牌の対子は1組と数えるため、ライブラリの値に「7 − 牌の種類数」を足したものと一致する
+    あわせて差分更新（ShantenState）が毎回の再計算と一致するかも確かめる。
+  hand_search: hand_search.py の探索が聴牌する13枚を漏れなく列挙するかを、
+    配牌から取り得るすべての13枚を形判定する総当たりと比べる（総当たりできる大きさの配牌を使う）。
+    あわせて上位候補の並びが総当たりで求めた順位と一致するかも確かめる。
+  batch_eval: batch_eval.py の行列判定（純Python・numpyの両方、小さなチャンクに分けたもの）が
+    1行ずつの判定（hand_shape.is_winning_shape / find_waits）と一致するかを確かめる。
+    13・14枚以外の行や5枚以上の牌を含む行が 0 になることも確かめる。
+
+使い方:
+  python verify.py
+  python verify.py --only shanten --size 20000 --seed 1
+  python verify.py --only hand_search --pools 20
+  python verify.py --only batch_eval --size 50000
+
+不一致があれば例を表示して終了コード1で終わる。
+"""
+
+import argparse
+import random
+import sys
+
+from hand_shape import TERMINAL_HONOR_INDICES, find_waits, is_winning_shape
+from tile_codec import TILE_NAMES
+
+# 山（34種×4枚）
+_WALL = tuple(index for index in range(34) for _ in range(4))
+
+# 面子（刻子34種+順子21種）
+_MELDS = tuple((i, i, i) for i in range(34)) + tuple(
+    (s + n, s + n + 1, s + n + 2) for s in (0, 9, 18) for n in range(7)
+)
+
+# 表示する不一致の例の数
+_EXAMPLES = 5
+
+
+def _render(counts):
+    return "".join(TILE_NAMES[i] for i, c in enumerate(counts) for _ in range(c))
+
+
+def _random_hand(rng, size):
+    """
+    山から size 枚を無作為に引いた手牌（枚数ベクトル）
+    """
+    counts = [0] * 34
+    for index in rng.sample(_WALL, size):
+        counts[index] += 1
+    return counts
+
+
+def _flush_hand(rng, size):
+    """
+    1〜2種類の色だけから引いた手牌（多面待ち・4枚持ち・字牌の対子が出やすい）
+    """
+    kinds = []
+    for group in rng.sample(range(4), rng.choice((1, 2))):
+        kinds.extend(range(group * 9, group * 9 + (9 if group < 3 else 7)))
+    wall = [index for index in kinds for _ in range(4)]
+    while len(wall) < size:
+        wall.extend(rng.sample(_WALL, size))
+    counts = [0] * 34
+    for index in rng.sample(wall, size):
+        if counts[index] < 4:
+            counts[index] += 1
+    return _fill(rng, counts, size)
+
+
+def _near_complete_hand(rng, size):
+    """
+    4面子1雀頭から0〜3枚を入れ替えた手牌（聴牌・一向聴付近）
+    """
+    counts = [0] * 34
+    for meld in rng.sample(_MELDS, 4):
+        for index in meld:
+            counts[index] += 1
+    counts[rng.randrange(34)] += 2
+    counts = [min(c, 4) for c in counts]
+    for _ in range(rng.randrange(4)):
+        held = [i for i in range(34) if counts[i]]
+        counts[rng.choice(held)] -= 1
+    while sum(counts) > size:
+        held = [i for i in range(34) if counts[i]]
+        counts[rng.choice(held)] -= 1
+    return _fill(rng, counts, size)
+
+
+def _fill(rng, counts, size):
+    while sum(counts) < size:
+        index = rng.randrange(34)
+        if counts[index] < 4:
+            counts[index] += 1
+    return counts
+
+
+_HAND_BUILDERS = (_random_hand, _flush_hand, _near_complete_hand)
+
+
+def _hands(rng, count):
+    """
+    13枚・14枚の手牌を作り方を順に替えながら count 件作る
+    """
+    for n in range(count):
+        builder = _HAND_BUILDERS[n % len(_HAND_BUILDERS)]
+        yield builder(rng, 13 if n // len(_HAND_BUILDERS) % 2 else 14)
+
+
+class _Report:
+    """
+    1項目の検査件数と不一致の例
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.checked = 0
+        self.mismatches = 0
+        self.examples = []
+        self.notes = {}
+
+    def fail(self, message):
+        self.mismatches += 1
+        if len(self.examples) < _EXAMPLES:
+            self.examples.append(message)
+
+    def note(self, key):
+        self.notes[key] = self.notes.get(key, 0) + 1
+
+    def print(self):
+        status = "OK" if not self.mismatches else "NG"
+        notes = "".join(f" {key}={value}" for key, value in sorted(self.notes.items()))
+        print(f"{status} {self.name}: {self.checked}件中 不一致 {self.mismatches}件{notes}")
+        for example in self.examples:
+            print(f"   {example}")
+
+
+def check_shanten(seed, size):
+    """
+    向聴数を点数計算ライブラリと比べる（既知の違いは許容し、件数を notes に数える）
+    """
+    from mahjong.shanten import Shanten
+    from shanten import ShantenState, calculate_shanten
+
+    reference = Shanten()
+    report = _Report("shanten")
+    rng = random.Random(f"{seed}:shanten")
+    for counts in _hands(rng, size):
+        report.checked += 1
+        ours = calculate_shanten(counts)
+        hand = _render(counts)
+
+        standard = reference.calculate_shanten_for_regular_hand(counts)
+        if ours["standard"] != standard:
+            if 4 in counts and ours["standard"] > standard:
+                report.note("quadKaraten")
+            else:
+                report.fail(f"通常形 {hand}: {ours['standard']} (ライブラリ {standard})")
+
+        kinds = sum(1 for c in counts if c)
+        chiitoitsu = reference.calculate_shanten_for_chiitoitsu_hand(counts)
+        if chiitoitsu >= 0:
+            chiitoitsu += max(0, 7 - kinds)
+        if ours["chiitoitsu"] != chiitoitsu:
+            report.fail(f"七対子 {hand}: {ours['chiitoitsu']} (期待値 {chiitoitsu})")
+
+        kokushi = reference.calculate_shanten_for_kokushi_hand(counts)
+        if ours["kokushi"] != kokushi:
+            report.fail(f"国士無双 {hand}: {ours['kokushi']} (ライブラリ {kokushi})")
+
+        # 差分更新: 1枚抜いて別の1枚を加えた状態が再計算と一致するか
+        state = ShantenState(counts)
+        removed = rng.choice([i for i in range(34) if counts[i]])
+        state.remove(removed)
+        added = rng.choice([i for i in range(34) if state.counts[i] < 4 and i != removed])
+        state.add(added)
+        expected = calculate_shanten(state.counts)["shanten"]
+        if state.shanten != expected:
+            report.fail(f"差分更新 {hand} −{TILE_NAMES[removed]} +{TILE_NAMES[added]}: "
+                        f"{state.shanten} (再計算 {expected})")
+    return report
+
+
+def _pool(rng, n):
+    """
+    聴牌形を多く含む小さな配牌（4面子1雀頭・七対子・国士無双に無作為な牌を足したもの、または1色だけの牌）
+    """
+    kind = n % 4
+    counts = [0] * 34
+    if kind == 0:
+        counts = _near_complete_hand(rng, 14)
+        size = 21
+    elif kind == 1:
+        for index in rng.sample(range(34), 7):
+            counts[index] = 2
+        size = 20
+    elif kind == 2:
+        for index in TERMINAL_HONOR_INDICES:
+            counts[index] = 1
+        size = 19
+    else:
+        suit = rng.randrange(3)
+        for index in rng.sample(_WALL[suit * 36:suit * 36 + 36], 22):
+            counts[index] += 1
+        return counts
+    return _fill(rng, counts, size)
+
+
+def _sub_hands(pool, size=13):
+    """
+    配牌から取り得る size 枚の手牌（枚数ベクトルのbytes）をすべて列挙する
+    """
+    kinds = [i for i in range(34) if pool[i]]
+    hand = bytearray(34)
+
+    def fill(k, left):
+        if left == 0:
+            yield bytes(hand)
+            return
+        if k == len(kinds):
+            return
+        index = kinds[k]
+        for count in range(min(pool[index], left), -1, -1):
+            hand[index] = count
+            yield from fill(k + 1, left - count)
+        hand[index] = 0
+
+    yield from fill(0, size)
+
+
+def check_hand_search(seed, pools):
+    """
+    聴牌形探索の列挙が総当たりと一致するか（漏れ・余分・上位候補の順位）
+    """
+    from hand_search import SEARCH_TOP_K, search_tenpai_hands
+
+    report = _Report("hand_search")
+    rng = random.Random(f"{seed}:hand_search")
+    for n in range(pools):
+        pool = _pool(rng, n)
+        expected = {}
+        for hand in _sub_hands(pool):
+            waits = find_waits(hand)
+            if waits:
+                expected[hand] = (sum(max(0, 4 - pool[w]) for w in waits), len(waits))
+        report.checked += len(expected)
+
+        # 時間予算で打ち切らず、候補数の上限なしで列挙させる
+        result = search_tenpai_hands(pool, budget_ms=1e9, top_k=len(expected) + 1)
+        if not result["complete"]:
+            report.fail(f"打ち切り 配牌 {_render(pool)}: 時間予算内に探索が終わっていない")
+        found = {candidate["counts"] for candidate in result["candidates"]}
+        for hand in set(expected) - found:
+            report.fail(f"漏れ 配牌 {_render(pool)}: {_render(hand)}")
+        for hand in found - set(expected):
+            report.fail(f"余分 配牌 {_render(pool)}: {_render(hand)}")
+
+        # 既定の候補数では、総当たりで上位の（待ちの広さ, 待ちの種類数）と同じ並びになる
+        top = search_tenpai_hands(pool, budget_ms=1e9)["candidates"]
+        ranks = sorted(expected.values(), reverse=True)[:SEARCH_TOP_K]
+        got = [(candidate["width"], len(candidate["waits"])) for candidate in top]
+        if got != ranks:
+            report.fail(f"順位 配牌 {_render(pool)}: {got} (総当たり {ranks})")
+    report.notes["hands"] = report.checked
+    report.checked = pools
+    return report
+
+
+def _special_hand(rng, size):
+    """
+    七対子・国士無双の形から0〜1枚を入れ替えた手牌
+    """
+    counts = [0] * 34
+    if rng.randrange(2):
+        for index in rng.sample(range(34), 7):
+            counts[index] = 2
+    else:
+        for index in TERMINAL_HONOR_INDICES:
+            counts[index] = 1
+        counts[rng.choice(TERMINAL_HONOR_INDICES)] += 1
+    while sum(counts) > size or rng.randrange(3) == 0:
+        counts[rng.choice([i for i in range(34) if counts[i]])] -= 1
+    return _fill(rng, counts, size)
+
+
+def _invalid_row(rng):
+    """
+    判定の対象外になる行（13・14枚以外、または5枚以上の牌を含む）
+    """
+    if rng.randrange(2):
+        return _random_hand(rng, rng.choice((0, 1, 12, 15, 18)))
+    counts = _random_hand(rng, rng.choice((8, 9)))
+    counts[rng.randrange(34)] = 5
+    return counts
+
+
+def check_batch_eval(seed, size):
+    """
+    行列判定の結果が1行ずつの判定と一致するか（純Python・numpy、チャンク分割あり）
+    """
+    from batch_eval import evaluate_matrix, has_numpy
+
+    report = _Report("batch_eval")
+    rng = random.Random(f"{seed}:batch_eval")
+    rows = []
+    for n, counts in enumerate(_hands(rng, size)):
+        if n % 7 == 0:
+            counts = _special_hand(rng, len(rows) % 2 + 13)
+        elif n % 11 == 0:
+            counts = _invalid_row(rng)
+        rows.append(counts)
+
+    expected = []
+    for counts in rows:
+        total = sum(counts)
+        if max(counts) > 4:
+            expected.append((0, 0))
+        elif total == 14:
+            expected.append((1 if is_winning_shape(counts) else 0, 0))
+        elif total == 13:
+            expected.append((0, sum(1 << i for i in find_waits(counts))))
+        else:
+            expected.append((0, 0))
+        if expected[-1][0]:
+            report.note("wins")
+        elif expected[-1][1]:
+            report.note("tenpai")
+
+    matrix = b"".join(bytes(counts) for counts in rows)
+    paths = [("python", False)] + ([("numpy", True)] if has_numpy() else [])
+    for label, use_numpy in paths:
+        # 行数で割り切れないチャンクの大きさにして、チャンクの境目と端数の処理も通す
+        for chunk_rows in (None, 997):
+            wins, waits = evaluate_matrix(matrix, chunk_rows=chunk_rows, use_numpy=use_numpy)
+            if len(wins) != len(rows) or len(waits) != len(rows):
+                report.fail(f"{label} chunk={chunk_rows}: 結果の行数 {len(wins)}/{len(waits)} (入力 {len(rows)})")
+                continue
+            for counts, (win, mask), got_win, got_mask in zip(rows, expected, wins, waits):
+                if (int(got_win), int(got_mask)) != (win, mask):
+                    report.fail(f"{label} chunk={chunk_rows} {_render(counts)} ({sum(counts)}枚): "
+                                f"勝ち{int(got_win)} 待ち{int(got_mask):#x} (1行ずつ 勝ち{win} 待ち{mask:#x})")
+    report.checked = len(rows)
+    report.notes["paths"] = len(paths)
+    return report
+
+
+CHECKS = {
+    'shanten': check_shanten,
+    'hand_search': check_hand_search,
+    'batch_eval': check_batch_eval,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="判定処理の整合性チェック")
+    parser.add_argument("--only", default=",".join(CHECKS), help=f"実行する項目（カンマ区切り: {', '.join(CHECKS)}）")
+    parser.add_argument("--seed", type=int, default=0, help="手牌の乱数シード")
+    parser.add_argument("--size", type=int, default=20000, help="向聴数などの項目ごとの手牌数")
+    parser.add_argument("--pools", type=int, default=12, help="聴牌形探索の総当たりに使う配牌数")
+    args = parser.parse_args()
+
+    names = [name.strip() for name in args.only.split(",") if name.strip()]
+    unknown = [name for name in names if name not in CHECKS]
+    if unknown:
+        parser.error(f"不明な項目: {', '.join(unknown)}")
+
+    failed = False
+    for name in names:
+        report = CHECKS[name](args.seed, args.pools if name == 'hand_search' else args.size)
+        report.print()
+        failed = failed or report.mismatches > 0
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
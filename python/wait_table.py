@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+手牌13枚に対する34種すべての和了牌の判定表
+
+GAME_RULES.md では手牌が局を通して固定で常時リーチのため、捨て牌ごとに変わるのは和了牌だけになる。
+手牌とドラ表示牌から34種それぞれの和了可否・飜・符・点数・役を1回で求め、
+ブラウザ側で捨て牌ごとの判定をサーバーに問い合わせずに済ませられる小さな形式で返す。
+
+JSON形式（compact）:
+  {"v": 1, "dora": ドラ表示牌, "yaku": [役名...], "waits": [[34種インデックス, 飜, 符, 点数, [役番号...]], ...]}
+  waits に無い牌は和了できない。役番号は yaku の添字。
+
+バイナリ形式（リトルエンディアン）:
+  b"WT" 版数(B) ドラ表示牌(B, 34種インデックス・無しは255)
+  和了できる牌のビットマスク(Q) 役名の数(B) [役名の長さ(B) 役名(UTF-8)]...
+  和了できる牌ごとに昇順で: 飜(B) 符(B) 点数(I) 役の数(B) [役番号(B)]...
+"""
+
+import struct
+
+from mahjong_engine import RULE_RIICHI, get_engine
+from hand_shape import find_waits
+from tile_codec import TILE_NAMES, tile_to_index, tiles_to_counts
+
+FORMAT_VERSION = 1
+_MAGIC = b"WT"
+_NO_DORA = 255
+
+
+def build_wait_table(tiles, dora, rule=RULE_RIICHI):
+    """
+    34種それぞれを和了牌とした判定結果のリスト（和了できない牌はNone）
+
+    形の上で待ちになる牌だけ点数計算し、それ以外は計算せずにNoneとする。
+    """
+    engine = get_engine()
+    table = [None] * 34
+    for index in find_waits(tiles_to_counts(tiles)):
+        result = engine.check_win(tiles, TILE_NAMES[index], dora, rule)
+        if result.get("isWinning", False):
+            table[index] = result
+    return table
+
+
+def _yaku_names(table):
+    names = []
+    for result in table:
+        for name in (result or {}).get("yaku", ()):
+            if name not in names:
+                names.append(name)
+    return names
+
+
+def encode_json(table, dora=None):
+    """
+    判定表をJSON用のコンパクトな辞書にする
+    """
+    names = _yaku_names(table)
+    numbers = {name: n for n, name in enumerate(names)}
+    return {
+        "v": FORMAT_VERSION,
+        "dora": dora,
+        "yaku": names,
+        "waits": [
+            [index, result["han"], result["fu"], result["points"], [numbers[name] for name in result["yaku"]]]
+            for index, result in enumerate(table) if result
+        ]
+    }
+
+
+def decode_json(data):
+    """
+    encode_json の辞書を34要素の判定表に戻す
+    """
+    if data.get("v") != FORMAT_VERSION:
+        raise ValueError(f"対応していない判定表の版数: {data.get('v')}")
+    names = data["yaku"]
+    table = [None] * 34
+    for index, han, fu, points, yaku in data["waits"]:
+        table[index] = {
+            "isWinning": True,
+            "points": points,
+            "han": han,
+            "fu": fu,
+            "yaku": [names[n] for n in yaku]
+        }
+    return table
+
+
+def encode_binary(table, dora=None):
+    """
+    判定表をバイト列にする
+    """
+    names = _yaku_names(table)
+    numbers = {name: n for n, name in enumerate(names)}
+    mask = 0
+    for index, result in enumerate(table):
+        if result:
+            mask |= 1 << index
+
+    parts = [struct.pack("<2sBBQB", _MAGIC, FORMAT_VERSION,
+                         _NO_DORA if dora is None else tile_to_index(dora), mask, len(names))]
+    for name in names:
+        encoded = name.encode("utf-8")
+        parts.append(struct.pack("<B", len(encoded)) + encoded)
+    for result in table:
+        if result:
+            yaku = [numbers[name] for name in result["yaku"]]
+            parts.append(struct.pack(f"<BBIB{len(yaku)}B", result["han"], result["fu"],
+                                     result["points"], len(yaku), *yaku))
+    return b"".join(parts)
+
+
+def decode_binary(data):
+    """
+    encode_binary のバイト列を (34要素の判定表, ドラ表示牌) に戻す
+    """
+    magic, version, dora, mask, name_count = struct.unpack_from("<2sBBQB", data)
+    if magic != _MAGIC or version != FORMAT_VERSION:
+        raise ValueError("判定表の形式が不正です")
+    offset = struct.calcsize("<2sBBQB")
+    names = []
+    for _ in range(name_count):
+        length = data[offset]
+        names.append(bytes(data[offset + 1:offset + 1 + length]).decode("utf-8"))
+        offset += 1 + length
+
+    table = [None] * 34
+    for index in range(34):
+        if not mask >> index & 1:
+            continue
+        han, fu, points, count = struct.unpack_from("<BBIB", data, offset)
+        offset += struct.calcsize("<BBIB")
+        yaku = struct.unpack_from(f"<{count}B", data, offset)
+        offset += count
+        table[index] = {
+            "isWinning": True,
+            "points": points,
+            "han": han,
+            "fu": fu,
+            "yaku": [names[n] for n in yaku]
+        }
+    return table, (None if dora == _NO_DORA else TILE_NAMES[dora])
+
+
+def wait_table(tiles, dora, rule=RULE_RIICHI):
+    """
+    判定表をJSON形式で返す（プロセスプールに渡せるモジュール関数）
+    """
+    return encode_json(build_wait_table(tiles, dora, rule), dora)
+
+
+def wait_table_binary(tiles, dora, rule=RULE_RIICHI):
+    """
+    判定表をバイナリ形式で返す（プロセスプールに渡せるモジュール関数）
+    """
+    return encode_binary(build_wait_table(tiles, dora, rule), dora)
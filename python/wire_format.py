@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+APIの応答のコンパクトなバイナリ形式（Accept ヘッダーで選択、既定はJSONのまま）
+
+JSONと同じ値（辞書・リスト・文字列・数値・真偽値・null）をそのまま表せる自己記述形式で、
+牌文字列は34種インデックスの1バイト、牌のリスト（手牌・待ち）は長さ+インデックスの列にし、
+その他の文字列（キー・役名など）は初出で本体を書いて以降は番号で参照する。
+バッチ判定のように同じキー・役名が繰り返される応答ほど小さくなる。
+JSONで返す場合の変換（json_bytes）も、任意のorjsonがあればそれを使うようここにまとめている。
+
+形式（整数の長さ・番号は符号なしLEB128、整数の値はジグザグ符号化したLEB128）:
+  b"MJ" 版数(B) 値
+  値 = 型(B) に続けて
+    0x00 null / 0x01 false / 0x02 true
+    0x03 整数 / 0x04 浮動小数点数（<d）
+    0x05 牌（34種インデックス B）
+    0x06 文字列の本体（長さ・UTF-8、出現順に番号を振る） / 0x07 文字列の参照（番号）
+    0x08 牌のリスト（長さ・インデックス B の列）
+    0x09 リスト（長さ・値の列） / 0x0A 辞書（長さ・キーの値と値の組の列）
+"""
+
+import base64
+import json
+import struct
+
+from tile_codec import TILE_NAMES
+
+try:
+    import orjson
+except ImportError:  # orjsonは任意（無ければ標準のjsonで変換する）
+    orjson = None
+
+MEDIA_TYPE = "application/x-mahjong-compact"
+FORMAT_VERSION = 1
+_HEADER = b"MJ" + bytes((FORMAT_VERSION,))
+
+_NULL, _FALSE, _TRUE, _INT, _FLOAT, _TILE, _STRING, _STRING_REF, _TILES, _LIST, _DICT = range(11)
+
+# 1バイトで表す牌（別表記の 発・1z・赤ドラは入力どおりに戻せるよう文字列として扱う）
+_TILE_CODES = {name: index for index, name in enumerate(TILE_NAMES)}
+_DOUBLE = struct.Struct("<d")
+
+
+def _quality(accept):
+    """
+    Accept ヘッダーのメディアタイプごとの q 値
+    """
+    qualities = {}
+    for part in accept.split(","):
+        media_type, _, params = part.partition(";")
+        quality = 1.0
+        for param in params.split(";"):
+            key, _, value = param.partition("=")
+            if key.strip() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[media_type.strip().lower()] = quality
+    return qualities
+
+
+def accepts_compact(accept):
+    """
+    Accept ヘッダーでコンパクト形式が求められているか
+
+    コンパクト形式が明示され、application/json より q 値が低くない場合だけ選ぶ（*/* ではJSONのまま）。
+    """
+    if not accept or MEDIA_TYPE not in accept.lower():
+        return False
+    qualities = _quality(accept)
+    compact = qualities.get(MEDIA_TYPE, 0.0)
+    return compact > 0 and compact >= qualities.get("application/json", 0.0)
+
+
+def _write_varint(out, value):
+    while value > 0x7F:
+        out.append(value & 0x7F | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _encode(value, out, strings):
+    kind = type(value)
+    if kind is str:
+        index = _TILE_CODES.get(value)
+        if index is not None:
+            out.append(_TILE)
+            out.append(index)
+            return
+        number = strings.get(value)
+        if number is not None:
+            out.append(_STRING_REF)
+            _write_varint(out, number)
+            return
+        strings[value] = len(strings)
+        data = value.encode("utf-8")
+        out.append(_STRING)
+        _write_varint(out, len(data))
+        out += data
+    elif kind is dict:
+        out.append(_DICT)
+        _write_varint(out, len(value))
+        for key, item in value.items():
+            _encode(key, out, strings)
+            _encode(item, out, strings)
+    elif kind is list or kind is tuple:
+        codes = _TILE_CODES
+        if value and all(type(item) is str and item in codes for item in value):
+            out.append(_TILES)
+            _write_varint(out, len(value))
+            out += bytes(codes[item] for item in value)
+            return
+        out.append(_LIST)
+        _write_varint(out, len(value))
+        for item in value:
+            _encode(item, out, strings)
+    elif value is None:
+        out.append(_NULL)
+    elif kind is bool:
+        out.append(_TRUE if value else _FALSE)
+    elif kind is int:
+        out.append(_INT)
+        _write_varint(out, value << 1 if value >= 0 else (-value << 1) - 1)
+    elif kind is float:
+        out.append(_FLOAT)
+        out += _DOUBLE.pack(value)
+    else:
+        raise TypeError(f"コンパクト形式にできない値: {kind.__name__}")
+
+
+def encode(value):
+    """
+    JSONにできる値をコンパクト形式のバイト列にする
+    """
+    out = bytearray(_HEADER)
+    _encode(value, out, {})
+    return bytes(out)
+
+
+class _Reader:
+    def __init__(self, data):
+        self.data = data
+        self.offset = len(_HEADER)
+        self.strings = []
+
+    def varint(self):
+        data = self.data
+        result = 0
+        shift = 0
+        while True:
+            byte = data[self.offset]
+            self.offset += 1
+            result |= (byte & 0x7F) << shift
+            if byte < 0x80:
+                return result
+            shift += 7
+
+    def value(self):
+        kind = self.data[self.offset]
+        self.offset += 1
+        if kind == _TILE:
+            self.offset += 1
+            return TILE_NAMES[self.data[self.offset - 1]]
+        if kind == _STRING_REF:
+            return self.strings[self.varint()]
+        if kind == _STRING:
+            length = self.varint()
+            text = self.data[self.offset:self.offset + length].decode("utf-8")
+            self.offset += length
+            self.strings.append(text)
+            return text
+        if kind == _DICT:
+            count = self.varint()
+            result = {}
+            for _ in range(count):
+                key = self.value()
+                result[key] = self.value()
+            return result
+        if kind == _TILES:
+            count = self.varint()
+            start = self.offset
+            self.offset += count
+            return [TILE_NAMES[index] for index in self.data[start:self.offset]]
+        if kind == _LIST:
+            return [self.value() for _ in range(self.varint())]
+        if kind == _INT:
+            value = self.varint()
+            return value >> 1 if not value & 1 else -((value + 1) >> 1)
+        if kind == _FLOAT:
+            value = _DOUBLE.unpack_from(self.data, self.offset)[0]
+            self.offset += _DOUBLE.size
+            return value
+        if kind == _NULL:
+            return None
+        if kind == _TRUE:
+            return True
+        if kind == _FALSE:
+            return False
+        raise ValueError(f"不正な型: {kind}")
+
+
+def decode(data):
+    """
+    encode のバイト列を値に戻す
+    """
+    data = bytes(data)
+    if data[:len(_HEADER)] != _HEADER:
+        raise ValueError("コンパクト形式ではないか、対応していない版数です")
+    try:
+        return _Reader(data).value()
+    except IndexError:
+        raise ValueError("コンパクト形式のデータが途中で切れています") from None
+
+
+def json_bytes(value):
+    """
+    JSONのバイト列（UTF-8・区切りの空白なし、orjsonがあればそれで変換する）
+    """
+    if orjson is not None:
+        return orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(value, ensure_ascii=False, allow_nan=False, indent=None,
+                      separators=(",", ":")).encode("utf-8")
+
+
+def request_accept(request):
+    """
+    VercelのRequestオブジェクトの Accept ヘッダー（取得できなければNone）
+    """
+    headers = getattr(request, 'headers', None)
+    if headers is None:
+        return None
+    return headers.get('accept') or headers.get('Accept')
+
+
+def serverless_response(result, accept=None, status_code=200):
+    """
+    Vercelハンドラの応答（Accept に応じてJSONか、base64にしたコンパクト形式）
+    """
+    if accepts_compact(accept):
+        return {
+            'statusCode': status_code,
+            'headers': {'Content-Type': MEDIA_TYPE, 'Vary': 'Accept'},
+            'body': base64.b64encode(encode(result)).decode('ascii'),
+            'isBase64Encoded': True
+        }
+    return {
+        'statusCode': status_code,
+        'headers': {'Content-Type': 'application/json', 'Vary': 'Accept'},
+        'body': json_bytes(result).decode('utf-8')
+    }
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+CPU負荷の高い判定処理をイベントループの外で実行するプロセスプール
+
+asyncioのイベントループから同期処理を直接呼ぶと、1件の重い判定で
+同じワーカーの他のリクエスト（ヘルスチェック含む）が全て止まる。
+ここではプロセスプールに処理を渡し、GILに縛られずに複数コアを使う。
+"""
+
+import asyncio
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+
+class PoolOverloadedError(Exception):
+    """
+    待ち行列が上限に達している、または停止処理中
+    """
+
+
+class PoolTimeoutError(Exception):
+    """
+    リクエストごとのタイムアウトを超えた
+    """
+
+
+class PoolBrokenError(Exception):
+    """
+    ワーカープロセスが異常終了した（プールは作り直され、以降のリクエストは新しいプールで実行する）
+    """
+
+
+def available_cpus():
+    """
+    このプロセスが使えるCPU数（CPUアフィニティと、コンテナのCPU制限 cgroup v2 の cpu.max を考慮）
+    """
+    try:
+        count = len(os.sched_getaffinity(0))
+    except AttributeError:  # sched_getaffinity の無いOS
+        count = os.cpu_count() or 1
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()[:2]
+        if quota != "max":
+            count = min(count, max(1, int(quota) // int(period)))
+    except (OSError, ValueError):
+        pass
+    return count
+
+
+def _warm_up():
+    """
+    ワーカープロセス起動時に分解テーブルと判定エンジンを読み込んでおく
+    """
+    from suit_table import get_table
+    from mahjong_engine import get_engine
+    get_table()
+    get_engine().warm_up()
+
+
+class WorkerPool:
+    """
+    同時実行数の上限・タイムアウト・停止時の処理待ちを備えたプロセスプール
+    """
+
+    def __init__(self, workers=None, max_pending=None, timeout=10.0, drain_timeout=30.0):
+        self.workers = workers or available_cpus()
+        # 実行中+待機中の上限（超えた分は即座に503で返す）
+        self.max_pending = max_pending or self.workers * 8
+        self.timeout = timeout
+        self.drain_timeout = drain_timeout
+        self._executor = None
+        self._in_flight = 0
+        self._draining = False
+        self._idle = None
+        self.completed = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.restarts = 0
+
+    def start(self):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_warm_up)
+            self._draining = False
+        return self
+
+    async def run(self, func, *args, timeout=None):
+        """
+        func(*args) をワーカープロセスで実行し、結果を返す
+
+        タイムアウトしても実行中の処理自体は中断されず、結果が捨てられるだけ。
+        """
+        if self._draining:
+            self.rejected += 1
+            raise PoolOverloadedError("サーバー停止処理中です")
+        if self._in_flight >= self.max_pending:
+            self.rejected += 1
+            raise PoolOverloadedError("処理待ちのリクエストが多すぎます")
+
+        self.start()
+        if self._idle is None:
+            self._idle = asyncio.Event()
+            self._idle.set()
+
+        loop = asyncio.get_running_loop()
+        executor = self._executor
+        try:
+            future = executor.submit(func, *args)
+        except BrokenProcessPool:
+            # 前回の異常終了に気付く前に投入した場合は、作り直したプールで1回だけやり直す
+            self._restart(executor)
+            executor = self.start()._executor
+            future = executor.submit(func, *args)
+        self._in_flight += 1
+        self._idle.clear()
+        # タイムアウトしても処理はワーカーで続くので、枠は処理が実際に終わった時点で返す
+        future.add_done_callback(lambda _: self._call_soon(loop, self._release))
+        try:
+            result = await asyncio.wait_for(asyncio.wrap_future(future), timeout or self.timeout)
+            self.completed += 1
+            return result
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise PoolTimeoutError("判定処理がタイムアウトしました")
+        except BrokenProcessPool:
+            self._restart(executor)
+            raise PoolBrokenError("ワーカープロセスが異常終了しました")
+
+    @staticmethod
+    def _call_soon(loop, callback):
+        # 完了の通知はプールの管理スレッドから来るので、イベントループのスレッドで処理する
+        try:
+            loop.call_soon_threadsafe(callback)
+        except RuntimeError:  # イベントループが既に閉じている
+            pass
+
+    def _release(self):
+        self._in_flight -= 1
+        if self._in_flight == 0:
+            self._idle.set()
+
+    def _restart(self, executor):
+        """
+        異常終了したプールを捨てる（次の start で新しいプールを作る）
+        """
+        if self._executor is executor and executor is not None:
+            self._executor = None
+            self.restarts += 1
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    async def drain(self):
+        """
+        新規受付を止め、実行中の処理が終わるのを待ってからプールを停止する
+        """
+        self._draining = True
+        if self._idle is not None and self._in_flight > 0:
+            try:
+                await asyncio.wait_for(self._idle.wait(), self.drain_timeout)
+            except asyncio.TimeoutError:
+                pass
+        if self._executor is not None:
+            executor = self._executor
+            self._executor = None
+            # 待機中のプロセス終了はイベントループを止めないように別スレッドで待つ
+            await asyncio.get_running_loop().run_in_executor(
+                None, lambda: executor.shutdown(wait=True, cancel_futures=True)
+            )
+
+    def stats(self):
+        return {
+            "workers": self.workers,
+            "maxPending": self.max_pending,
+            "inFlight": self._in_flight,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "timeouts": self.timeouts,
+            "restarts": self.restarts,
+            "draining": self._draining
+        }